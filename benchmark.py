@@ -0,0 +1,502 @@
+"""Micro-benchmarks for the COVID-19 tracker's data paths.
+
+Times the queries behind the tracker's windows headlessly, either against a
+local copy of the dataset or against a synthetic OWID-shaped CSV generated
+at a chosen scale, so runs can be repeated on any machine.
+
+Usage:
+    python benchmark.py [path/to/owid_covid_data.csv]
+    python benchmark.py --synthetic --scale medium --json results.json
+    python benchmark.py --synthetic --json new.json --baseline results.json
+    python benchmark.py --generate synthetic.csv --locations 250 --days 1200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from covid_tracker import (
+    CACHE_DIR, DATA_FILE, TRENDS_COLUMNS, VACCINATION_METRICS,
+    CovidDataset, LocationIndex, date_slice, load_dataset,
+)
+
+# Columns of the OWID dataset, in file order
+OWID_COLUMNS = [
+    "iso_code", "continent", "location", "date",
+    "total_cases", "new_cases", "new_cases_smoothed",
+    "total_deaths", "new_deaths", "new_deaths_smoothed",
+    "total_cases_per_million", "new_cases_per_million", "new_cases_smoothed_per_million",
+    "total_deaths_per_million", "new_deaths_per_million", "new_deaths_smoothed_per_million",
+    "reproduction_rate",
+    "icu_patients", "icu_patients_per_million", "hosp_patients", "hosp_patients_per_million",
+    "weekly_icu_admissions", "weekly_icu_admissions_per_million",
+    "weekly_hosp_admissions", "weekly_hosp_admissions_per_million",
+    "total_tests", "new_tests", "total_tests_per_thousand", "new_tests_per_thousand",
+    "new_tests_smoothed", "new_tests_smoothed_per_thousand", "positive_rate", "tests_per_case", "tests_units",
+    "total_vaccinations", "people_vaccinated", "people_fully_vaccinated", "total_boosters",
+    "new_vaccinations", "new_vaccinations_smoothed",
+    "total_vaccinations_per_hundred", "people_vaccinated_per_hundred",
+    "people_fully_vaccinated_per_hundred", "total_boosters_per_hundred",
+    "new_vaccinations_smoothed_per_million", "new_people_vaccinated_smoothed",
+    "new_people_vaccinated_smoothed_per_hundred",
+    "stringency_index", "population_density", "median_age", "aged_65_older", "aged_70_older",
+    "gdp_per_capita", "extreme_poverty", "cardiovasc_death_rate", "diabetes_prevalence",
+    "female_smokers", "male_smokers", "handwashing_facilities", "hospital_beds_per_thousand",
+    "life_expectancy", "human_development_index", "population",
+    "excess_mortality_cumulative_absolute", "excess_mortality_cumulative",
+    "excess_mortality", "excess_mortality_cumulative_per_million",
+]
+
+# Synthetic dataset sizes as (countries, days)
+SCALES = {"small": (60, 365), "medium": (150, 800), "full": (230, 1200)}
+
+CONTINENTS = ["Africa", "Asia", "Europe", "North America", "Oceania", "South America"]
+
+# Aggregates as (iso_code, location); continents get OWID_ codes too
+AGGREGATES = [
+    ("OWID_WRL", "World"),
+    ("OWID_HIC", "High income"), ("OWID_UMC", "Upper middle income"),
+    ("OWID_LMC", "Lower middle income"), ("OWID_LIC", "Low income"),
+    ("OWID_EUN", "European Union"), ("OWID_INT", "International"),
+] + [("OWID_" + name[:3].upper() + str(i), name) for i, name in enumerate(CONTINENTS)]
+
+# Columns that hold one value per location (repeated on every row)
+STATIC_COLUMNS = [
+    "population", "population_density", "median_age", "aged_65_older", "aged_70_older",
+    "gdp_per_capita", "extreme_poverty", "cardiovasc_death_rate", "diabetes_prevalence",
+    "female_smokers", "male_smokers", "handwashing_facilities", "hospital_beds_per_thousand",
+    "life_expectancy", "human_development_index",
+]
+
+# Vaccination reporting starts about this many days into the series
+VACCINATION_START = 340
+
+# Timings of old code paths (and of the machine itself) kept for comparison
+# only; --baseline does not gate them
+REFERENCE_TIMINGS = {"lookup_boolean_scan", "calibration"}
+
+# Slowdowns smaller than this many seconds per call are noise, whatever their ratio
+NOISE_FLOOR = 20e-6
+
+
+def group_cumsum(values, starts):
+    """Running sum of values restarting at every group start (values must not contain NaN)."""
+    sums = np.cumsum(values)
+    offsets = np.repeat(np.r_[0.0, sums[starts[1:] - 1]], np.diff(np.r_[starts, len(values)]))
+    return sums - offsets
+
+
+def group_rolling_mean(values, starts, window=7):
+    """Trailing mean over `window` rows within each group (NaN until the window is full)."""
+    sums = np.r_[0.0, np.cumsum(values)]
+    positions = np.arange(len(values))
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(values)]))
+    result = (sums[positions + 1] - sums[np.maximum(positions + 1 - window, 0)]) / window
+    return np.where(positions - group_start >= window - 1, result, np.nan)
+
+
+def synthetic_frame(countries=60, days=365, columns=None, seed=0):
+    """Build an OWID-shaped frame with realistic gaps.
+
+    Countries start reporting on different days, aggregates (World, continents,
+    income groups, EU) carry OWID_ codes, hospital data exists for a minority
+    of countries, weekly columns have one value a week, vaccinations start late
+    and with gaps, and static columns are missing for some countries.
+    ``columns`` keeps the key columns plus the first N metric columns.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    locations = [
+        ("".join(letters[[i // 676 % 26, i // 26 % 26, i % 26]]), CONTINENTS[i % len(CONTINENTS)], f"Country {i:03d}")
+        for i in range(countries)
+    ] + [(iso, None, name) for iso, name in AGGREGATES]
+    locations.sort(key=lambda location: location[2])
+    n_locations = len(locations)
+
+    # Rows: each location reports from its own first day to the last date
+    first_day = rng.integers(0, max(days // 10, 1), n_locations)
+    first_day[[i for i, location in enumerate(locations) if location[0].startswith("OWID_")]] = 0
+    lengths = days - first_day
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    n = int(lengths.sum())
+    owner = np.repeat(np.arange(n_locations), lengths)
+    day = np.arange(n) - starts[owner] + first_day[owner]
+
+    population = rng.lognormal(16, 1.5, n_locations).round()
+    population[[i for i, location in enumerate(locations) if location[0] == "OWID_WRL"]] = 7.9e9
+    pop = population[owner]
+    wave = 1.2 + np.sin(day / 90.0 + rng.uniform(0, 6, n_locations)[owner])
+    data = {}
+
+    def count(rate):
+        return rng.poisson(np.maximum(np.nan_to_num(rate), 0)).astype(np.float64)
+
+    data["new_cases"] = count(pop * 2e-4 * wave)
+    data["new_deaths"] = count(data["new_cases"] * 0.01)
+    data["new_tests"] = count(data["new_cases"] * rng.uniform(5, 30, n_locations)[owner])
+    data["new_vaccinations"] = np.where(day >= VACCINATION_START, count(pop * 3e-3), 0.0)
+    for prefix in ["cases", "deaths", "tests", "vaccinations"]:
+        new = data[f"new_{prefix}"]
+        data[f"total_{prefix}"] = group_cumsum(new, starts)
+        data[f"new_{prefix}_smoothed"] = group_rolling_mean(new, starts)
+    data["people_vaccinated"] = np.minimum(data["total_vaccinations"] * 0.55, pop * 0.95)
+    data["people_fully_vaccinated"] = np.minimum(data["total_vaccinations"] * 0.4, data["people_vaccinated"])
+    data["total_boosters"] = np.maximum(data["total_vaccinations"] - data["people_vaccinated"] - data["people_fully_vaccinated"], 0)
+    data["new_people_vaccinated_smoothed"] = group_rolling_mean(np.r_[0, np.diff(data["people_vaccinated"])], starts)
+    for column in ["total_cases", "new_cases", "new_cases_smoothed", "total_deaths", "new_deaths",
+                   "new_deaths_smoothed", "new_vaccinations_smoothed"]:
+        data[f"{column}_per_million"] = data[column] / pop * 1e6
+    for column in ["total_tests", "new_tests", "new_tests_smoothed"]:
+        data[f"{column}_per_thousand"] = data[column] / pop * 1e3
+    for column in ["total_vaccinations", "people_vaccinated", "people_fully_vaccinated", "total_boosters",
+                   "new_people_vaccinated_smoothed"]:
+        data[f"{column}_per_hundred"] = data[column] / pop * 1e2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        data["positive_rate"] = np.clip(data["new_cases_smoothed"] / data["new_tests_smoothed"], 0, 1)
+        data["tests_per_case"] = data["new_tests_smoothed"] / data["new_cases_smoothed"]
+    data["reproduction_rate"] = np.round(0.6 + wave * 0.4 + rng.normal(0, 0.05, n), 2)
+    data["stringency_index"] = np.round(np.clip(50 + 30 * np.sin(day / 120.0), 0, 100), 2)
+
+    # Hospital data for about a third of the countries
+    hospital = (rng.random(n_locations) < 0.35)[owner]
+    data["icu_patients"] = np.where(hospital, count(data["new_cases_smoothed"] * 0.05), np.nan)
+    data["hosp_patients"] = np.where(hospital, count(data["new_cases_smoothed"] * 0.3), np.nan)
+    weekly = hospital & (day % 7 == 6)
+    data["weekly_icu_admissions"] = np.where(weekly, count(data["new_cases_smoothed"] * 0.1), np.nan)
+    data["weekly_hosp_admissions"] = np.where(weekly, count(data["new_cases_smoothed"] * 0.7), np.nan)
+    for column in ["icu_patients", "hosp_patients", "weekly_icu_admissions", "weekly_hosp_admissions"]:
+        data[f"{column}_per_million"] = data[column] / pop * 1e6
+
+    # Excess mortality: weekly, for about half of the locations
+    excess = (rng.random(n_locations) < 0.5)[owner] & (day % 7 == 6)
+    data["excess_mortality"] = np.where(excess, np.round(rng.normal(10, 8, n), 2), np.nan)
+    data["excess_mortality_cumulative"] = np.where(excess, np.round(rng.normal(8, 4, n), 2), np.nan)
+    data["excess_mortality_cumulative_absolute"] = np.where(excess, np.round(data["total_deaths"] * 1.2), np.nan)
+    data["excess_mortality_cumulative_per_million"] = data["excess_mortality_cumulative_absolute"] / pop * 1e6
+
+    # Reporting gaps: nothing before the vaccination start, then random missing days
+    vaccination_columns = [column for column in data if "vaccin" in column or "booster" in column]
+    reported = (day >= VACCINATION_START) & (rng.random(n) > 0.3)
+    for column in vaccination_columns:
+        data[column] = np.where(reported, data[column], np.nan)
+    for column in ["new_tests", "total_tests", "positive_rate", "tests_per_case"]:
+        data[column] = np.where(rng.random(n) > 0.4, data[column], np.nan)
+
+    # Static columns, missing entirely for some countries
+    for column in STATIC_COLUMNS:
+        values = population if column == "population" else np.round(rng.uniform(1, 100, n_locations), 3)
+        present = rng.random(n_locations) > (0.0 if column == "population" else 0.15)
+        data[column] = np.where(present, values, np.nan)[owner]
+
+    # Per-row tests_units text, as in the real file
+    units = np.array(["tests performed", "people tested", "samples tested", None], dtype=object)
+    data["tests_units"] = np.where(np.isnan(data["new_tests"]), None, units[rng.integers(0, 4, n_locations)][owner])
+
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(day, unit="D")
+    frame = pd.DataFrame({
+        "iso_code": np.array([location[0] for location in locations], dtype=object)[owner],
+        "continent": np.array([location[1] for location in locations], dtype=object)[owner],
+        "location": np.array([location[2] for location in locations], dtype=object)[owner],
+        "date": dates.strftime("%Y-%m-%d"),
+    })
+    metric_columns = [column for column in OWID_COLUMNS[4:] if column in data]
+    if columns is not None:
+        metric_columns = metric_columns[:max(columns, 0)]
+    return pd.concat([frame, pd.DataFrame({column: data[column] for column in metric_columns})], axis=1)
+
+
+def generate_dataset(path, countries=60, days=365, columns=None, seed=0):
+    """Write a synthetic OWID-shaped CSV (see synthetic_frame); returns its row count."""
+    frame = synthetic_frame(countries, days, columns, seed)
+    frame.to_csv(path, index=False, float_format="%.6g")
+    return len(frame)
+
+
+def time_per_call(func, args_list, repeat=5, setup=None):
+    """Return the fastest over several passes of the mean time per call (in seconds).
+
+    The fastest pass is the one least disturbed by other work on the
+    machine. ``setup()`` runs before each pass, outside the timing.
+    """
+    passes = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        passes.append((time.perf_counter() - start) / len(args_list))
+    return float(min(passes))
+
+
+def report(results, name, seconds, detail=""):
+    """Record a timing and print it."""
+    results[name] = seconds
+    print(f"  {name:<28} {seconds * 1e6:12.1f} us  {detail}")
+
+
+def bench_load(csv_path, results, repeat=5):
+    """Cold CSV parse, columnar-cache load and lazy (key columns only) load."""
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR)
+    remove_cache = lambda: shutil.rmtree(cache_dir, ignore_errors=True)
+    print("Load")
+    report(results, "load_csv", time_per_call(lambda: load_dataset(csv_path, use_cache=False), [()], repeat))
+    report(results, "build_cache", time_per_call(lambda: load_dataset(csv_path), [()], repeat, setup=remove_cache))
+    report(results, "load_cached", time_per_call(lambda: CovidDataset.load(csv_path), [()], repeat))
+    report(results, "load_lazy", time_per_call(lambda: CovidDataset.load(csv_path, lazy=True), [()], repeat))
+
+
+def bench_location_lookup(df, results):
+    """Compare boolean-mask country filtering with LocationIndex slicing."""
+    index = LocationIndex(df)
+    locations = [(location,) for location in index.by_location]
+
+    def boolean_scan(location):
+        return df[df['location'] == location].copy()
+
+    def index_slice(location):
+        return df.iloc[index.location_slice(location)]
+
+    # Both paths must agree before their timings mean anything
+    for (location,) in locations[:5]:
+        assert np.array_equal(boolean_scan(location).index, index_slice(location).index)
+
+    scan = time_per_call(boolean_scan, locations, repeat=3)
+    sliced = time_per_call(index_slice, locations)
+    print(f"Per-location lookup over {len(df):,} rows, {len(locations)} locations")
+    report(results, "lookup_boolean_scan", scan, "boolean scan + copy (reference)")
+    report(results, "lookup_index_slice", sliced, f"LocationIndex slice ({scan / sliced:.0f}x faster)")
+
+
+def bench_country_data(dataset, results, metric="new_cases"):
+    """get_country_data for every location, with an empty and with a warm series cache."""
+    locations = [(location, metric) for location in dataset.index.by_location]
+
+    def cold(location, metric):
+        dataset.series_cache.invalidate(location)
+        return dataset.get_country_data(location, metric)
+
+    print("Country data")
+    report(results, "country_data_cold", time_per_call(cold, locations))
+    report(results, "country_data_cached", time_per_call(dataset.get_country_data, locations))
+
+
+def bench_top_countries(dataset, results, metrics=("total_cases", "new_cases", "total_deaths_per_million")):
+    """Top-10 rankings on the common date, raw and smoothed."""
+    dataset.require(list(metrics))
+    print("Top countries")
+    report(results, "top_n", time_per_call(lambda metric: dataset.snapshot.top_countries(metric, 10), [(m,) for m in metrics]))
+
+    def smoothed(metric):
+        dataset.smoothing.cache.clear()
+        return dataset.snapshot.top_countries(metric, 10, dataset.smoothing.smooth(metric, "mean", 7))
+
+    report(results, "top_n_smoothed_cold", time_per_call(smoothed, [(m,) for m in metrics]))
+
+
+def bench_vaccination(dataset, results):
+    """Latest value per country and the full vaccination window queries."""
+    metrics = [(metric,) for metric in VACCINATION_METRICS]
+    dataset.require([metric for (metric,) in metrics])
+
+    def latest(metric):
+        dataset.snapshot._last_valid.pop(metric, None)
+        return dataset.snapshot.last_valid(metric)
+
+    continents = [(metric, continent) for (metric,) in metrics for continent in ["All"] + dataset.geography.continents()]
+    print("Vaccination")
+    report(results, "vaccination_latest", time_per_call(latest, metrics))
+    report(results, "vaccination_view", time_per_call(dataset.prepare_vaccination_data, continents))
+
+
+def bench_trends(dataset, results, days=365):
+    """Rows for the country stats Trends tab: location slice plus the last year."""
+    dataset.require(TRENDS_COLUMNS)
+    date_range = dataset.date_range(days=days)
+
+    def trends(location):
+        rows = dataset.location_rows(location)
+        return rows.iloc[date_slice(rows['date'].to_numpy(), date_range)]
+
+    print("Trends tab")
+    report(results, "trends_rows", time_per_call(trends, [(location,) for location in dataset.index.by_location]))
+
+
+def calibration_work():
+    """Fixed NumPy and pure-Python work that depends only on the machine's speed."""
+    values = np.random.default_rng(0).random(200_000)
+    np.sort(values).cumsum()
+    return sum(i * i for i in range(100_000))
+
+
+def bench_calibration(results, repeat=5):
+    """Time calibration_work, so comparisons can allow for a machine that is busier than before."""
+    print("Machine")
+    report(results, "calibration", time_per_call(calibration_work, [()], repeat), "(reference)")
+
+
+def run_benchmarks(csv_path, repeat=5):
+    """Run every benchmark against a CSV; returns {name: seconds per call}."""
+    results = {}
+    bench_calibration(results, repeat)
+    bench_load(csv_path, results, repeat)
+
+    df = load_dataset(csv_path)
+    print(f"Loaded {len(df):,} rows x {len(df.columns)} columns")
+    bench_location_lookup(df, results)
+
+    dataset = CovidDataset(df)
+    bench_country_data(dataset, results)
+    bench_top_countries(dataset, results)
+    bench_vaccination(dataset, results)
+    bench_trends(dataset, results)
+    return results
+
+
+def environment():
+    """Machine and library versions stored with the results."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def machine_slowdown(timings, baseline):
+    """How much slower the machine ran than for the baseline, from the calibration timings (never below 1)."""
+    now, before = timings.get("calibration"), baseline["timings"].get("calibration")
+    return max(1.0, now / before) if now and before else 1.0
+
+
+def slower_timings(timings, baseline, threshold, noise_floor=NOISE_FLOOR):
+    """Names of the timings that count as regressions against a baseline.
+
+    A timing counts when it is more than ``threshold`` (relative) and
+    ``noise_floor`` seconds (absolute) slower, after allowing for a machine
+    that is busier than it was for the baseline (see machine_slowdown).
+    Reference timings never count.
+    """
+    slowdown = machine_slowdown(timings, baseline)
+    slower = []
+    for name, seconds in timings.items():
+        before = baseline["timings"].get(name)
+        if not before or name in REFERENCE_TIMINGS:
+            continue
+        allowed = before * slowdown
+        if seconds > allowed * (1 + threshold) and seconds - allowed > noise_floor:
+            slower.append(name)
+    return slower
+
+
+def compare(results, baseline, threshold, noise_floor=NOISE_FLOOR):
+    """Print current vs baseline timings; returns the regressions (see slower_timings)."""
+    if baseline.get("dataset") != results.get("dataset"):
+        print("Warning: the baseline was measured on a different dataset; ratios may not be meaningful")
+    regressions = slower_timings(results["timings"], baseline, threshold, noise_floor)
+    print(f"\nCompared with baseline ({baseline.get('created', 'unknown date')}):")
+    slowdown = machine_slowdown(results["timings"], baseline)
+    if slowdown > 1:
+        print(f"  (the machine ran {slowdown:.2f}x slower than for the baseline; allowed for below)")
+    for name, seconds in results["timings"].items():
+        before = baseline["timings"].get(name)
+        if not before:
+            print(f"  {name:<28} {'(new)':>12}")
+            continue
+        ratio = seconds / before
+        status = ""
+        if name in REFERENCE_TIMINGS:
+            status = "(reference)"
+        elif name in regressions:
+            status = "SLOWER"
+        elif ratio < 1 - threshold and before - seconds > noise_floor:
+            status = "faster"
+        print(f"  {name:<28} {before * 1e6:12.1f} -> {seconds * 1e6:12.1f} us  {ratio:6.2f}x  {status}")
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the tracker's data paths")
+    parser.add_argument("csv", nargs="?", help=f"OWID CSV to benchmark (default {DATA_FILE})")
+    parser.add_argument("--synthetic", action="store_true", help="benchmark a generated dataset instead of a CSV")
+    parser.add_argument("--generate", metavar="PATH", help="only write a synthetic CSV to PATH")
+    parser.add_argument("--scale", choices=SCALES, default="small", help="synthetic dataset size (default small)")
+    parser.add_argument("--locations", type=int, help="number of synthetic countries (overrides --scale)")
+    parser.add_argument("--days", type=int, help="number of synthetic days (overrides --scale)")
+    parser.add_argument("--columns", type=int, help="number of synthetic metric columns (default all)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic data")
+    parser.add_argument("--repeat", type=int, default=5, help="passes per load benchmark (the fastest is kept)")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default 0.25)")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR * 1e6,
+                        help=f"smallest slowdown per call, in microseconds, reported as a regression "
+                             f"(default {NOISE_FLOOR * 1e6:.0f})")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv[1:])
+    countries, days = SCALES[args.scale]
+    countries = args.locations or countries
+    days = args.days or days
+    synthetic = {"countries": countries, "days": days, "columns": args.columns, "seed": args.seed}
+
+    if args.generate:
+        rows = generate_dataset(args.generate, countries, days, args.columns, args.seed)
+        print(f"Wrote {rows:,} rows to {args.generate}")
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            csv_path = os.path.join(tmp, "owid_covid_data.csv")
+            start = time.perf_counter()
+            rows = generate_dataset(csv_path, countries, days, args.columns, args.seed)
+            print(f"Generated {rows:,} synthetic rows in {time.perf_counter() - start:.1f}s")
+            dataset = {"synthetic": synthetic}
+        else:
+            csv_path = args.csv or DATA_FILE
+            dataset = {"path": os.path.abspath(csv_path), "bytes": os.path.getsize(csv_path)}
+        timings = run_benchmarks(csv_path, args.repeat)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            # A regression has to show up again: rerun once and keep each timing's faster run
+            slower = slower_timings(timings, baseline, args.threshold, args.noise_floor / 1e6)
+            if slower:
+                print(f"\nRerunning to confirm {len(slower)} slower timing(s)")
+                rerun = run_benchmarks(csv_path, args.repeat)
+                timings = {name: min(seconds, rerun.get(name, seconds)) for name, seconds in timings.items()}
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dataset": dataset,
+        "environment": environment(),
+        "timings": timings,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, baseline, args.threshold, args.noise_floor / 1e6)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,29 +1,2548 @@
+import io
+import os
+import ast
+import copy
+import re
+import sys
+import csv
+import json
+import asyncio
+import time
+import argparse
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+try:
+    import numexpr
+except ImportError:  # optional; derived metrics are evaluated with NumPy without it
+    numexpr = None
+import queue
+import pstats
+import shutil
+import cProfile
+import hashlib
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qsl
 import seaborn as sns
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib
-matplotlib.use("TkAgg")
+
+DATA_FILE = "owid_covid_data.csv"
+
+# Columnar cache of the CSV, written next to it on first load
+CACHE_DIR = ".owid_cache"
+CACHE_VERSION = 2
+
+# Text columns that are stored as categoricals
+CATEGORICAL_COLUMNS = ["iso_code", "continent", "location"]
+
+# Largest integer a float32 can hold exactly
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+# Compact storage: a column is stored sparse when that takes at most this
+# share of its dense size; larger integer counts use nullable Int32 up to its limit
+SPARSE_MAX_SIZE = 0.5
+INT32_LIMIT = 2 ** 31 - 1
+
+# Metrics offered in the main graph
+METRICS = [
+    "total_cases", "new_cases", 
+    "total_deaths", "new_deaths",
+    "total_cases_per_million", "new_cases_per_million",
+    "total_deaths_per_million", "new_deaths_per_million",
+    "icu_patients", "hosp_patients", 
+    "total_vaccinations", "people_vaccinated",
+    "people_fully_vaccinated", "total_boosters",
+    "reproduction_rate"
+]
+
+# Most locations drawn together in the overlay view
+MAX_OVERLAY = 20
+
+# Smoothing choices in the main window: windows count reported values
+SMOOTHING_WINDOWS = ["Auto", "Off", "3", "7", "14", "28"]
+SMOOTHING_METHODS = {"Mean": "mean", "Median": "median", "Exponential": "ewm"}
+SMOOTHING_LABELS = {"mean": "Moving Average", "median": "Moving Median", "ewm": "Exponential Average"}
+
+# Date ranges in the main window (number of days up to the latest data);
+# "Custom" reads the From/To fields
+DATE_RANGES = {"All Dates": None, "Last 30 Days": 30, "Last 90 Days": 90, "Last 180 Days": 180, "Last Year": 365, "Custom": None}
+
+# Metrics offered in the vaccination progress window
+VACCINATION_METRICS = [
+    "people_vaccinated_per_hundred", 
+    "people_fully_vaccinated_per_hundred",
+    "total_boosters_per_hundred"
+]
+
+# Key metrics in the global stats window
+GLOBAL_STATS_METRICS = [
+    ("Total Cases", "total_cases"),
+    ("Total Deaths", "total_deaths"),
+    ("Cases per Million", "total_cases_per_million"),
+    ("Deaths per Million", "total_deaths_per_million"),
+    ("Total Vaccinations", "total_vaccinations"),
+    ("People Fully Vaccinated", "people_fully_vaccinated"),
+    ("Current Reproduction Rate", "reproduction_rate")
+]
+
+# Metrics computed from other columns, for every location at once (labels
+# and formats are in METRIC_INFO). Expressions use column names, numbers,
+# + - * / **, abs(), log(), sqrt() and lag(x, n): x as reported by the same
+# location n days earlier (missing when it has no row for that date).
+DERIVED_METRICS = {
+    "case_fatality_rate": "100 * total_deaths / total_cases",
+    "deaths_per_icu_patient": "new_deaths_smoothed / icu_patients",
+    "weekly_case_growth": "100 * (new_cases_smoothed / lag(new_cases_smoothed, 7) - 1)",
+    "people_fully_vaccinated_share": "100 * people_fully_vaccinated / population",
+}
+
+# Sections of the country stats "Current Stats" tab
+STATS_SECTIONS = [
+    ("Cases", ["total_cases", "new_cases", "new_cases_smoothed", "total_cases_per_million",
+               "new_cases_per_million", "new_cases_smoothed_per_million", "reproduction_rate"]),
+    ("Deaths", ["total_deaths", "new_deaths", "new_deaths_smoothed", "total_deaths_per_million",
+                "new_deaths_per_million", "new_deaths_smoothed_per_million"]),
+    ("Excess Mortality", ["excess_mortality", "excess_mortality_cumulative",
+                          "excess_mortality_cumulative_absolute", "excess_mortality_cumulative_per_million"]),
+    ("Hospitalizations", ["icu_patients", "hosp_patients", "icu_patients_per_million", "hosp_patients_per_million",
+                          "weekly_icu_admissions", "weekly_icu_admissions_per_million",
+                          "weekly_hosp_admissions", "weekly_hosp_admissions_per_million"]),
+    ("Testing", ["total_tests", "new_tests", "new_tests_smoothed", "total_tests_per_thousand",
+                 "new_tests_per_thousand", "new_tests_smoothed_per_thousand", "positive_rate", "tests_per_case"]),
+    ("Vaccinations", ["total_vaccinations", "people_vaccinated", "people_fully_vaccinated", "total_boosters",
+                      "new_vaccinations", "new_vaccinations_smoothed", "new_people_vaccinated_smoothed",
+                      "total_vaccinations_per_hundred", "people_vaccinated_per_hundred",
+                      "people_fully_vaccinated_per_hundred", "total_boosters_per_hundred",
+                      "new_vaccinations_smoothed_per_million", "new_people_vaccinated_smoothed_per_hundred"]),
+    ("Policy", ["stringency_index"]),
+    ("Health", ["cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers",
+                "handwashing_facilities", "hospital_beds_per_thousand", "extreme_poverty"]),
+    ("Derived Metrics", list(DERIVED_METRICS)),
+]
+
+# Country stats "Population Data" tab
+POPULATION_METRICS = [
+    ("Population", "population"),
+    ("Population Density", "population_density"),
+    ("Median Age", "median_age"),
+    ("Aged 65 Older", "aged_65_older"),
+    ("Aged 70 Older", "aged_70_older"),
+    ("GDP Per Capita", "gdp_per_capita"),
+    ("Life Expectancy", "life_expectancy"),
+    ("Human Development Index", "human_development_index")
+]
+
+# Display metadata of a metric: label, format kind (see VALUE_FORMATS) and unit
+MetricInfo = namedtuple("MetricInfo", ["label", "kind", "unit"])
+
+# Number formats by kind
+VALUE_FORMATS = {
+    "count": "{:,.0f}",
+    "decimal": "{:,.2f}",
+    "one_decimal": "{:,.1f}",
+    "percent": "{:.1f}%",
+    "currency": "${:,.0f}",
+    "index": "{:.3f}",
+}
+
+METRIC_INFO = {
+    # Cases and deaths
+    "total_cases": MetricInfo("Total Cases", "count", ""),
+    "new_cases": MetricInfo("New Cases", "count", ""),
+    "new_cases_smoothed": MetricInfo("New Cases (7-day avg)", "count", ""),
+    "total_cases_per_million": MetricInfo("Total Cases per Million", "decimal", ""),
+    "new_cases_per_million": MetricInfo("New Cases per Million", "decimal", ""),
+    "new_cases_smoothed_per_million": MetricInfo("New Cases per Million (7-day avg)", "decimal", ""),
+    "total_deaths": MetricInfo("Total Deaths", "count", ""),
+    "new_deaths": MetricInfo("New Deaths", "count", ""),
+    "new_deaths_smoothed": MetricInfo("New Deaths (7-day avg)", "count", ""),
+    "total_deaths_per_million": MetricInfo("Total Deaths per Million", "decimal", ""),
+    "new_deaths_per_million": MetricInfo("New Deaths per Million", "decimal", ""),
+    "new_deaths_smoothed_per_million": MetricInfo("New Deaths per Million (7-day avg)", "decimal", ""),
+    "reproduction_rate": MetricInfo("Reproduction Rate", "decimal", ""),
+    # Excess mortality
+    "excess_mortality": MetricInfo("Excess Mortality", "percent", ""),
+    "excess_mortality_cumulative": MetricInfo("Cumulative Excess Mortality", "percent", ""),
+    "excess_mortality_cumulative_absolute": MetricInfo("Cumulative Excess Deaths", "count", ""),
+    "excess_mortality_cumulative_per_million": MetricInfo("Cumulative Excess Deaths per Million", "decimal", ""),
+    # Hospitals
+    "icu_patients": MetricInfo("ICU Patients", "count", ""),
+    "icu_patients_per_million": MetricInfo("ICU Patients per Million", "decimal", ""),
+    "hosp_patients": MetricInfo("Hospital Patients", "count", ""),
+    "hosp_patients_per_million": MetricInfo("Hospital Patients per Million", "decimal", ""),
+    "weekly_icu_admissions": MetricInfo("Weekly ICU Admissions", "count", ""),
+    "weekly_icu_admissions_per_million": MetricInfo("Weekly ICU Admissions per Million", "decimal", ""),
+    "weekly_hosp_admissions": MetricInfo("Weekly Hospital Admissions", "count", ""),
+    "weekly_hosp_admissions_per_million": MetricInfo("Weekly Hospital Admissions per Million", "decimal", ""),
+    # Testing
+    "total_tests": MetricInfo("Total Tests", "count", ""),
+    "new_tests": MetricInfo("New Tests", "count", ""),
+    "new_tests_smoothed": MetricInfo("New Tests (7-day avg)", "count", ""),
+    "total_tests_per_thousand": MetricInfo("Total Tests per Thousand", "decimal", ""),
+    "new_tests_per_thousand": MetricInfo("New Tests per Thousand", "decimal", ""),
+    "new_tests_smoothed_per_thousand": MetricInfo("New Tests per Thousand (7-day avg)", "decimal", ""),
+    "positive_rate": MetricInfo("Positive Rate", "decimal", ""),
+    "tests_per_case": MetricInfo("Tests per Case", "decimal", ""),
+    # Vaccinations
+    "total_vaccinations": MetricInfo("Total Vaccinations", "count", ""),
+    "people_vaccinated": MetricInfo("People Vaccinated", "count", ""),
+    "people_fully_vaccinated": MetricInfo("People Fully Vaccinated", "count", ""),
+    "total_boosters": MetricInfo("Total Boosters", "count", ""),
+    "new_vaccinations": MetricInfo("New Vaccinations", "count", ""),
+    "new_vaccinations_smoothed": MetricInfo("New Vaccinations (7-day avg)", "count", ""),
+    "new_people_vaccinated_smoothed": MetricInfo("Newly Vaccinated People (7-day avg)", "count", ""),
+    "total_vaccinations_per_hundred": MetricInfo("Total Vaccinations per Hundred", "decimal", ""),
+    "people_vaccinated_per_hundred": MetricInfo("People Vaccinated", "percent", ""),
+    "people_fully_vaccinated_per_hundred": MetricInfo("People Fully Vaccinated", "percent", ""),
+    "total_boosters_per_hundred": MetricInfo("Boosters per Hundred", "percent", ""),
+    "new_vaccinations_smoothed_per_million": MetricInfo("New Vaccinations per Million (7-day avg)", "decimal", ""),
+    "new_people_vaccinated_smoothed_per_hundred": MetricInfo("Newly Vaccinated People (7-day avg)", "percent", ""),
+    # Policy and population
+    "stringency_index": MetricInfo("Stringency Index", "one_decimal", ""),
+    "population": MetricInfo("Population", "count", ""),
+    "population_density": MetricInfo("Population Density", "one_decimal", "per km²"),
+    "median_age": MetricInfo("Median Age", "one_decimal", "years"),
+    "aged_65_older": MetricInfo("Aged 65 Older", "percent", ""),
+    "aged_70_older": MetricInfo("Aged 70 Older", "percent", ""),
+    "gdp_per_capita": MetricInfo("GDP per Capita", "currency", ""),
+    "extreme_poverty": MetricInfo("Extreme Poverty", "percent", ""),
+    "cardiovasc_death_rate": MetricInfo("Cardiovascular Death Rate", "decimal", "per 100,000"),
+    "diabetes_prevalence": MetricInfo("Diabetes Prevalence", "percent", ""),
+    "female_smokers": MetricInfo("Female Smokers", "percent", ""),
+    "male_smokers": MetricInfo("Male Smokers", "percent", ""),
+    "handwashing_facilities": MetricInfo("Handwashing Facilities", "percent", ""),
+    "hospital_beds_per_thousand": MetricInfo("Hospital Beds per Thousand", "decimal", ""),
+    "life_expectancy": MetricInfo("Life Expectancy", "one_decimal", "years"),
+    "human_development_index": MetricInfo("Human Development Index", "index", ""),
+    # Derived metrics
+    "case_fatality_rate": MetricInfo("Case Fatality Rate", "percent", ""),
+    "deaths_per_icu_patient": MetricInfo("Deaths per ICU Patient", "decimal", ""),
+    "weekly_case_growth": MetricInfo("Weekly Case Growth", "percent", ""),
+    "people_fully_vaccinated_share": MetricInfo("Fully Vaccinated (%)", "percent", ""),
+}
+
+# Columns plotted in the country stats "Trends" tab
+TRENDS_COLUMNS = ["new_cases_smoothed", "new_deaths_smoothed", "positive_rate", "people_fully_vaccinated",
+                  "people_fully_vaccinated_share"]
+
+# Columns that identify a row
+KEY_COLUMNS = ["iso_code", "continent", "location", "date"]
+
+
+def metric_info(column):
+    """Display metadata of a column; columns missing from METRIC_INFO get a title-cased label."""
+    info = METRIC_INFO.get(column)
+    if info is None:
+        kind = "decimal" if "per_" in column or "_rate" in column else "count"
+        info = MetricInfo(column.replace('_', ' ').title(), kind, "")
+    return info
+
+
+def value_format(column):
+    """Format string of a column's values, including its unit."""
+    info = metric_info(column)
+    template = VALUE_FORMATS[info.kind]
+    return f"{template} {info.unit}" if info.unit else template
+
+
+def format_frame(df, columns=None):
+    """Format metric values as display strings, for one row or many at once.
+
+    Columns sharing a format are stacked and formatted in a single pass.
+    Returns a frame of strings with None for missing values; non-numeric
+    columns are left out.
+    """
+    columns = list(df.columns) if columns is None else list(dict.fromkeys(columns))
+    columns = [column for column in columns if column in df.columns and pd.api.types.is_numeric_dtype(df[column])]
+
+    by_format = {}
+    for column in columns:
+        by_format.setdefault(value_format(column), []).append(column)
+
+    formatted = {}
+    for template, group in by_format.items():
+        values = df[group].to_numpy(dtype=np.float64, na_value=np.nan)
+        flat = values.ravel()
+        present = ~np.isnan(flat)
+        text = np.full(flat.shape, None, dtype=object)
+        text[present] = [template.format(value) for value in flat[present].tolist()]
+        text = text.reshape(values.shape)
+        for i, column in enumerate(group):
+            formatted[column] = text[:, i]
+    return pd.DataFrame(formatted, index=df.index, columns=columns, dtype=object)
+
+
+def format_values(column, values):
+    """Format an array of one column's values (None where missing)."""
+    return format_frame(pd.DataFrame({column: np.asarray(values, dtype=np.float64)}))[column].tolist()
+
+
+def is_normalized(column):
+    """Whether a column is already a rate or a per-population value."""
+    return "per_" in column or column.endswith("_rate") or metric_info(column).kind == "percent"
+
+
+def country_stats_columns():
+    """Columns read by the country stats window (all three tabs)."""
+    columns = [column for _, metrics in STATS_SECTIONS for column in metrics]
+    columns += [column for _, column in POPULATION_METRICS]
+    return columns + TRENDS_COLUMNS
+
+
+def view_columns():
+    """All columns the tracker's views read, in a stable order (for low-memory loading).
+
+    Derived metrics are replaced by the columns they are computed from.
+    """
+    columns = KEY_COLUMNS + METRICS + VACCINATION_METRICS + TRENDS_COLUMNS
+    columns += [column for _, column in GLOBAL_STATS_METRICS + POPULATION_METRICS]
+    for _, metrics in STATS_SECTIONS:
+        columns += metrics
+    derived = DerivedMetrics()
+    columns += [column for name in DERIVED_METRICS for column in derived.inputs(name)]
+    return [column for column in dict.fromkeys(columns) if column not in DERIVED_METRICS]
+
+
+def downcast_metric(values):
+    """Return a float column as float32 when that loses no meaningful precision."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return values.astype(np.float32)
+
+    # Integer counts (cases, deaths, doses) must stay exact when displayed with
+    # thousands separators, so only downcast them while float32 is exact.
+    # Fractional metrics (rates, per-million values) keep ~7 significant digits.
+    if np.array_equal(finite, np.round(finite)) and np.abs(finite).max() > FLOAT32_EXACT_LIMIT:
+        return values
+    return values.astype(np.float32)
+
+
+def compact_frame(df):
+    """Convert a raw OWID frame to compact dtypes (categoricals, float32, datetimes)."""
+    compact = {}
+    for column in df.columns:
+        series = df[column]
+        if column == "date":
+            compact[column] = pd.to_datetime(series, format="%Y-%m-%d").astype("datetime64[ns]")
+        elif column in CATEGORICAL_COLUMNS or not pd.api.types.is_numeric_dtype(series):
+            compact[column] = series.astype("category")
+        else:
+            compact[column] = downcast_metric(series)
+    return pd.DataFrame(compact, index=df.index)
+
+
+def is_compact_storage(dtype):
+    """Whether a column uses one of the compact storage dtypes (sparse or nullable integer)."""
+    if isinstance(dtype, pd.SparseDtype):
+        return True
+    return isinstance(dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(dtype)
+
+
+def compact_column(values):
+    """Pick the smallest storage for a metric column and return it with its name.
+
+    Mostly-empty columns become sparse arrays when that at least halves
+    them, with a block index when the values come in long runs (as with
+    vaccinations that start late). Integer counts too large for an exact
+    float32 become nullable Int32. Everything else stays a dense float32
+    (or float64) array.
+    """
+    dense = downcast_metric(values)
+    present = ~np.isnan(dense)
+    if len(dense) and present.mean() <= SPARSE_MAX_SIZE:
+        runs = int(np.count_nonzero(np.diff(np.r_[0, present.astype(np.int8)]) == 1))
+        kind = "block" if 2 * runs < present.sum() else "integer"
+        sparse = pd.arrays.SparseArray(dense, fill_value=np.nan, kind=kind)
+        if sparse.nbytes <= dense.nbytes * SPARSE_MAX_SIZE:
+            return sparse, f"sparse ({kind})"
+
+    finite = dense[present]
+    if dense.dtype == np.float64 and finite.size and np.array_equal(finite, np.round(finite)) and np.abs(finite).max() <= INT32_LIMIT:
+        return pd.array(dense, dtype="Int32"), "Int32"
+    return dense, str(dense.dtype)
+
+
+def compact_storage(df, columns=None):
+    """Convert a frame's metric columns to compact storage in place.
+
+    Returns the report of each converted column: its storage and the bytes
+    used before and after.
+    """
+    report = {}
+    for column in df.columns if columns is None else columns:
+        series = df[column]
+        if column in KEY_COLUMNS or is_compact_storage(series.dtype) or not pd.api.types.is_float_dtype(series):
+            continue
+        before = series.array.nbytes
+        values, storage = compact_column(series.to_numpy())
+        df[column] = values
+        report[column] = {"storage": storage, "before": before, "after": df[column].array.nbytes}
+    return report
+
+
+def dense_values(series):
+    """A numeric column as a NumPy array; compact storage becomes float64 with NaN for missing values."""
+    if is_compact_storage(series.dtype):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return series.to_numpy()
+
+
+def stored_dtype(dtype):
+    """NumPy dtype a numeric column's values are stored at (sparse columns keep their subtype)."""
+    if isinstance(dtype, pd.SparseDtype):
+        return dtype.subtype
+    return np.dtype(np.float64) if is_compact_storage(dtype) else dtype
+
+
+def densify(frame):
+    """Return frame with its compact storage columns as dense float64 (frame itself if there are none)."""
+    dense = {column: dense_values(frame[column]) for column in frame.columns if is_compact_storage(frame[column].dtype)}
+    return frame.assign(**dense) if dense else frame
+
+
+def memory_report(report):
+    """Lines of a per-column storage report, largest saving first, with a total."""
+    lines = [f"{'column':<45} {'storage':<16} {'before':>10} {'after':>10} {'saved':>7}"]
+    rows = sorted(report.items(), key=lambda item: item[1]["before"] - item[1]["after"], reverse=True)
+    for column, entry in rows:
+        saved = 1 - entry["after"] / entry["before"] if entry["before"] else 0.0
+        lines.append(
+            f"{column:<45} {entry['storage']:<16} {entry['before'] / 2**20:8.2f}MB {entry['after'] / 2**20:8.2f}MB {saved:6.0%}"
+        )
+    before = sum(entry["before"] for entry in report.values())
+    after = sum(entry["after"] for entry in report.values())
+    lines.append(f"{'total':<45} {'':<16} {before / 2**20:8.2f}MB {after / 2**20:8.2f}MB {1 - after / before if before else 0:6.0%}")
+    return lines
+
+
+class DatasetCache:
+    """Versioned columnar cache of the OWID CSV, stored as one .npy file per column.
+
+    Categorical columns are stored as integer codes plus their categories and
+    dates as int32 day numbers, so a warm start only has to read raw arrays.
+    The cache is keyed by the CSV's size, modification time and a hash of its
+    first and last blocks, and is rebuilt whenever any of them change.
+    """
+
+    MANIFEST = "manifest.json"
+    HASH_BLOCK = 1 << 20
+
+    def __init__(self, csv_path=DATA_FILE, cache_dir=None):
+        self.csv_path = csv_path
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR)
+        self.cache_dir = cache_dir
+
+    def fingerprint(self, with_hash=True):
+        """Identify the current CSV by size, mtime and a sampled content hash."""
+        stat = os.stat(self.csv_path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if with_hash:
+            digest = hashlib.sha1(str(stat.st_size).encode())
+            with open(self.csv_path, "rb") as f:
+                digest.update(f.read(self.HASH_BLOCK))
+                if stat.st_size > self.HASH_BLOCK:
+                    f.seek(max(self.HASH_BLOCK, stat.st_size - self.HASH_BLOCK))
+                    digest.update(f.read())
+            fingerprint["hash"] = digest.hexdigest()
+        return fingerprint
+
+    def read_manifest(self):
+        """Return the manifest if it matches the current CSV, otherwise None."""
+        try:
+            with open(os.path.join(self.cache_dir, self.MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("version") != CACHE_VERSION:
+            return None
+
+        cached = manifest.get("csv", {})
+        current = self.fingerprint(with_hash=False)
+        if cached.get("size") != current["size"]:
+            return None
+        # A touched or copied file keeps its content hash, so only re-hash
+        # when the modification time has changed
+        if cached.get("mtime_ns") != current["mtime_ns"]:
+            if cached.get("hash") != self.fingerprint()["hash"]:
+                return None
+        return manifest
+
+    def cached_columns(self):
+        """Names of the columns in an up-to-date cache (empty if there is none)."""
+        manifest = self.read_manifest()
+        return [entry["name"] for entry in manifest["columns"]] if manifest else []
+
+    def load(self, columns=None):
+        """Load the cached frame, or return None when the cache is missing or stale.
+
+        With ``columns`` only those columns are read; otherwise the cache must
+        hold every column of the CSV.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None
+
+        entries = manifest["columns"]
+        if columns is None:
+            if not manifest.get("complete", True):
+                return None
+        else:
+            by_name = {entry["name"]: entry for entry in entries}
+            if any(column not in by_name for column in columns):
+                return None
+            entries = [by_name[column] for column in columns]
+
+        try:
+            loaded = {}
+            for entry in entries:
+                # Numeric columns are memory-mapped, so pages are read when first touched
+                mmap_mode = "r" if entry["kind"] == "numeric" else None
+                values = np.load(os.path.join(self.cache_dir, entry["file"]), mmap_mode=mmap_mode)
+                if entry["kind"] == "category":
+                    loaded[entry["name"]] = pd.Categorical.from_codes(values, entry["categories"])
+                elif entry["kind"] == "date":
+                    loaded[entry["name"]] = values.astype("datetime64[D]").astype("datetime64[ns]")
+                else:
+                    loaded[entry["name"]] = values
+            # copy=False keeps the memory-mapped arrays instead of copying them into blocks
+            return pd.DataFrame(loaded, copy=False)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, df, complete=True):
+        """Write a compact frame to the cache, replacing any previous version.
+
+        ``complete`` is False when the frame holds only some of the CSV's columns.
+        """
+        tmp_dir = f"{self.cache_dir}.tmp-{os.getpid()}"
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+
+            entries = []
+            for i, column in enumerate(df.columns):
+                series = df[column]
+                entry = {"name": column, "file": f"{i:03d}.npy"}
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    entry["kind"] = "category"
+                    entry["categories"] = [str(c) for c in series.cat.categories]
+                    values = series.cat.codes.to_numpy()
+                elif column == "date":
+                    entry["kind"] = "date"
+                    values = series.to_numpy().astype("datetime64[D]").astype(np.int32)
+                else:
+                    entry["kind"] = "numeric"
+                    values = series.to_numpy()
+                np.save(os.path.join(tmp_dir, entry["file"]), values)
+                entries.append(entry)
+
+            # The manifest is written last so a partial cache is never valid
+            manifest = {
+                "version": CACHE_VERSION,
+                "csv": self.fingerprint(),
+                "rows": len(df),
+                "complete": complete,
+                "columns": entries,
+            }
+            with open(os.path.join(tmp_dir, self.MANIFEST), "w") as f:
+                json.dump(manifest, f)
+
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.rename(tmp_dir, self.cache_dir)
+            return True
+        except OSError:
+            # A read-only data directory just means no cache
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+
+def sort_by_location(df):
+    """Return the frame sorted by (location, date) so each location is one contiguous block."""
+    codes = df['location'].cat.codes.to_numpy()
+    dates = df['date'].to_numpy()
+    same_location = codes[1:] == codes[:-1]
+    if np.all(codes[1:] >= codes[:-1]) and np.all(dates[1:][same_location] >= dates[:-1][same_location]):
+        return df
+
+    order = np.lexsort((dates, codes))
+    return df.take(order).reset_index(drop=True)
+
+
+def date_slice(dates, date_range):
+    """Slice of a date-sorted array inside date_range = (start, end), found by binary search.
+
+    Either bound may be None, and a date_range of None selects every row.
+    """
+    lo, hi = 0, len(dates)
+    if date_range is not None:
+        start, end = date_range
+        if start is not None:
+            lo = np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), side="left")
+        if end is not None:
+            hi = np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), side="right")
+    return slice(int(lo), int(max(lo, hi)))
+
+
+class LocationIndex:
+    """Row ranges of each location in a frame sorted by (location, date).
+
+    Built once per load and shifted by refreshes, so per-country lookups are
+    a dictionary hit plus an ``iloc`` slice instead of a string comparison
+    over every row.
+    """
+
+    def __init__(self, df):
+        codes = df['location'].cat.codes.to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(codes)]
+
+        # Rows with a missing location never belong to a lookup
+        named = codes[starts] >= 0 if len(starts) else np.array([], dtype=bool)
+        categories = df['location'].cat.categories
+        self.locations = [categories[code] for code in codes[starts[named]]]
+        self.set_ranges(df, starts[named], stops[named])
+
+    def set_ranges(self, df, starts, stops):
+        """Store the row ranges of self.locations and build the lookups."""
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        iso_codes = df['iso_code'].to_numpy()
+        by_location = {}
+        by_iso_code = {}
+        for location, start, stop in zip(self.locations, self.starts.tolist(), self.stops.tolist()):
+            bounds = slice(start, stop)
+            by_location[location] = bounds
+            if not pd.isna(iso_codes[start]):
+                by_iso_code[iso_codes[start]] = bounds
+        self.by_location = by_location
+        self.by_iso_code = by_iso_code
+
+    def insert_rows(self, df, counts):
+        """Shift the row ranges after ``counts[location]`` rows were inserted into each location.
+
+        ``df`` is the frame with the rows inserted. Locations the index does
+        not know yet come after the others, in category order (see merge_delta).
+        """
+        added = np.array([counts.get(location, 0) for location in self.locations], dtype=np.int64)
+        shift = np.cumsum(added) - added
+        starts = [self.starts + shift]
+        stops = [self.stops + shift + added]
+        categories = df['location'].cat.categories
+        new = sorted((location for location in counts if location not in self.by_location), key=categories.get_loc)
+        start = len(df) - sum(counts[location] for location in new)
+        for location in new:
+            starts.append([start])
+            stops.append([start + counts[location]])
+            start += counts[location]
+        self.locations = self.locations + new
+        self.set_ranges(df, np.concatenate(starts), np.concatenate(stops))
+
+    def location_slice(self, location):
+        """Row slice for a location name (empty if unknown)."""
+        return self.by_location.get(location, slice(0, 0))
+
+    def iso_slice(self, iso_code):
+        """Row slice for an ISO code such as 'OWID_WRL' (empty if unknown)."""
+        return self.by_iso_code.get(iso_code, slice(0, 0))
+
+
+class Geography:
+    """What each location is (country, continent, income group, world or other
+    aggregate) and which locations belong to each continent.
+
+    Built from one ISO code per location (and rebuilt when a refresh adds
+    locations), so views look these up instead of running string scans over
+    the frame. Arrays are aligned with ``index.locations``.
+    """
+
+    KINDS = ["country", "continent", "income", "world", "aggregate"]
+    INCOME_CODES = ["OWID_HIC", "OWID_UMC", "OWID_LMC", "OWID_LIC"]
+
+    def __init__(self, df, index):
+        self.index = index
+        self.update(df)
+
+    def update(self, df):
+        """Reclassify the locations (after the index added some)."""
+        index = self.index
+        iso_codes = df['iso_code'].to_numpy()[index.starts]
+        # Category codes compare safely whatever the missing value is (NaN or pd.NA)
+        continent_codes = df['continent'].cat.codes.to_numpy()[index.starts]
+        continent_names = list(df['continent'].cat.categories)
+
+        kinds = []
+        for location, iso in zip(index.locations, iso_codes):
+            # Everything without an OWID_ code is a country
+            if not (isinstance(iso, str) and iso.startswith('OWID_')):
+                kinds.append("country")
+            elif iso == 'OWID_WRL':
+                kinds.append("world")
+            elif iso in self.INCOME_CODES:
+                kinds.append("income")
+            elif location in continent_names:
+                kinds.append("continent")
+            else:
+                kinds.append("aggregate")
+
+        self.kinds = np.array(kinds, dtype=object)
+        self.kind_of = dict(zip(index.locations, kinds))
+        self.masks = {kind: self.kinds == kind for kind in self.KINDS}
+        self.continent_masks = {name: continent_codes == code for code, name in enumerate(continent_names)}
+        self.is_country = self.masks["country"]
+
+    def kind(self, location):
+        """Kind of a location, or None if it is unknown."""
+        return self.kind_of.get(location)
+
+    def mask(self, *kinds):
+        """Boolean array over index.locations selecting the given kinds."""
+        mask = np.zeros(len(self.kinds), dtype=bool)
+        for kind in kinds:
+            mask |= self.masks[kind]
+        return mask
+
+    def locations(self, *kinds):
+        """Locations of the given kinds, in index order."""
+        return [location for location, keep in zip(self.index.locations, self.mask(*kinds)) if keep]
+
+    def continent_mask(self, continent):
+        """Boolean array over index.locations selecting the members of a continent."""
+        mask = self.continent_masks.get(continent)
+        return mask if mask is not None else np.zeros(len(self.kinds), dtype=bool)
+
+    def continents(self):
+        """Names of the continents that have an aggregate location, sorted."""
+        return sorted(self.locations("continent"))
+
+
+class LatestSnapshot:
+    """Latest-date views of the dataset shared by the ranking and stats windows.
+
+    Holds the common reporting date (the most frequent last date across
+    locations), each location's last row, and, computed on first use per
+    metric, each location's last non-null value.
+    """
+
+    def __init__(self, df, index, geography):
+        self.index = index
+        self.geography = geography
+        self.update(df)
+
+    def update(self, df, changed=None):
+        """Recompute the latest views after the frame or the index changed.
+
+        Only one row per location is read. Cached last values are kept
+        except for the ``changed`` columns (all of them when None).
+        """
+        index = self.index
+        self.df = df
+        self.last_positions = dict(zip(index.locations, (index.stops - 1).tolist()))
+
+        dates = df['date'].to_numpy()
+        last_dates = dates[index.stops - 1]
+        self.common_date = pd.Series(last_dates).value_counts().idxmax() if len(last_dates) else None
+        self.last_date = pd.Timestamp(last_dates.max()) if len(last_dates) else None
+
+        # Countries only (continents, income groups and World have OWID_ codes)
+        self.is_country = pd.Series(self.geography.is_country, index=index.locations)
+
+        # Positions of the country rows on the common date, found by binary
+        # search within each country's rows. Stored as positions rather than a
+        # frame so columns loaded later are included.
+        positions = []
+        is_country = self.geography.is_country
+        common_date = pd.Timestamp(self.common_date).to_datetime64() if self.common_date is not None else None
+        for start, stop in zip(index.starts[is_country].tolist(), index.stops[is_country].tolist()):
+            position = start + int(np.searchsorted(dates[start:stop], common_date))
+            if position < stop and dates[position] == common_date:
+                positions.append(position)
+        self.common_positions = np.array(positions, dtype=np.intp)
+
+        if changed is None:
+            self._last_valid = {}
+        else:
+            self._last_valid = {metric: values for metric, values in self._last_valid.items() if metric not in changed}
+
+    def latest_row(self, location):
+        """Get a location's last row as a one-row frame (empty if unknown)."""
+        position = self.last_positions.get(location)
+        if position is None:
+            return densify(self.df.iloc[0:0])
+        return densify(self.df.iloc[[position]])
+
+    def last_valid(self, metric):
+        """Get each location's last non-null value of a metric, indexed by location."""
+        if metric not in self._last_valid:
+            values = self.df[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+            positions = np.where(np.isnan(values), -1, np.arange(len(values)))
+            last = np.maximum.reduceat(positions, self.index.starts) if len(self.index.starts) else positions[:0]
+            latest = np.where(last >= self.index.starts, values[np.maximum(last, 0)], np.nan)
+            self._last_valid[metric] = pd.Series(latest, index=self.index.locations)
+        return self._last_valid[metric]
+
+    def top_countries(self, metric, n=10, values=None):
+        """Get the n countries with the highest value of a metric on the common date.
+
+        ``values`` (aligned with the frame's rows, e.g. a smoothed metric)
+        replaces the metric's own values.
+        """
+        rows = densify(self.df.iloc[self.common_positions])
+        if values is not None:
+            rows = rows.assign(**{metric: values[self.common_positions]})
+        return rows.sort_values(by=metric, ascending=False).head(n)
+
+
+# One record of the profiler's ring buffer (start is seconds since the profiler was created)
+StageTiming = namedtuple("StageTiming", ["stage", "start", "seconds", "blocks", "thread"])
+
+
+class Profiler:
+    """Records how long the tracker's stages take in a ring buffer of recent timings.
+
+    Stages are timed from any thread with ``stage()`` or the ``timed()``
+    decorator. Each record also holds the change in allocated memory blocks
+    (sys.getallocatedblocks) over the stage; while several threads are busy
+    this includes their allocations too. ``start_profile``/``stop_profile``
+    run cProfile on the calling thread and on every background query started
+    in between, and combine the results.
+    """
+
+    # Before Python 3.12 cProfile only sees the thread that enabled it, so each
+    # background query gets its own profile. From 3.12 (sys.monitoring) one
+    # profile covers every thread and a second one cannot be enabled.
+    PER_THREAD_PROFILES = not hasattr(sys, "monitoring")
+
+    def __init__(self, capacity=4096):
+        self.records = deque(maxlen=capacity)
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.profiles = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with-block as one record of the named stage."""
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start, sys.getallocatedblocks() - blocks)
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function as a stage (named after the function by default)."""
+        def decorate(func):
+            stage = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, name, start, seconds, blocks=0):
+        """Add a timing measured elsewhere (start is a time.perf_counter() value)."""
+        timing = StageTiming(name, start - self.origin, seconds, blocks, threading.current_thread().name)
+        with self.lock:
+            self.records.append(timing)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def stats(self):
+        """Count, last/mean/max milliseconds and last block delta of each stage in the buffer."""
+        with self.lock:
+            records = list(self.records)
+        stats = {}
+        for timing in records:
+            entry = stats.setdefault(timing.stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = timing.seconds * 1e3
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["last_ms"] = ms
+            entry["blocks"] = timing.blocks
+        for entry in stats.values():
+            entry["mean_ms"] = entry.pop("total_ms") / entry["count"]
+        return stats
+
+    def summary(self, limit=6):
+        """One line with the slowest stages by mean time, for the status bar overlay."""
+        stats = sorted(self.stats().items(), key=lambda item: item[1]["mean_ms"], reverse=True)
+        if not stats:
+            return "Profiler: no timings yet"
+        return " | ".join(
+            f"{stage} {entry['last_ms']:.1f} ms (avg {entry['mean_ms']:.1f}, {entry['blocks']:+,} blocks)"
+            for stage, entry in stats[:limit]
+        )
+
+    def dump_trace(self, path):
+        """Write the buffer as a Chrome trace (open it in chrome://tracing or Perfetto)."""
+        with self.lock:
+            records = list(self.records)
+        pid = os.getpid()
+        # Trace viewers expect numeric thread ids; names go in metadata events
+        tids = {thread: tid for tid, thread in enumerate(dict.fromkeys(timing.thread for timing in records))}
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}}
+            for thread, tid in tids.items()
+        ]
+        events += [
+            {
+                "name": timing.stage,
+                "ph": "X",
+                "ts": timing.start * 1e6,
+                "dur": timing.seconds * 1e6,
+                "pid": pid,
+                "tid": tids[timing.thread],
+                "args": {"blocks": timing.blocks},
+            }
+            for timing in records
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(records)
+
+    @property
+    def profiling(self):
+        return self.profiles is not None
+
+    def start_profile(self):
+        """Start a cProfile session on the calling thread."""
+        if self.profiling:
+            return
+        main = cProfile.Profile()
+        self.profiles = [main]
+        main.enable()
+
+    def profile_call(self, func):
+        """Call func(), under its own cProfile session while profiling (for worker threads).
+
+        Where the main session already covers every thread, func() is just called.
+        """
+        if not self.profiling or not self.PER_THREAD_PROFILES:
+            return func()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func)
+        finally:
+            with self.lock:
+                if self.profiles is not None:
+                    self.profiles.append(profile)
+
+    def stop_profile(self, path=None):
+        """Stop profiling and return the combined pstats.Stats, also saved to path if given."""
+        if not self.profiling:
+            return None
+        with self.lock:
+            profiles, self.profiles = self.profiles, None
+        profiles[0].disable()
+        stats = pstats.Stats(*profiles)
+        if path:
+            stats.dump_stats(path)
+        return stats
+
+
+# Stage timings of this process
+PROFILER = Profiler()
+
+# Refresh interval of the profiler overlay in the main window
+PROFILE_OVERLAY_MS = 500
+
+
+class BackgroundWorker:
+    """Run data queries on a thread pool and hand the results back to the Tk thread.
+
+    Every request belongs to a channel (one per view). Submitting a new request
+    on a channel supersedes the previous one: it is cancelled if it has not
+    started yet, and its result is discarded if it has. Results are delivered
+    on the Tk thread by polling a queue with ``root.after``. ``when_idle``
+    runs a function on the Tk thread between requests, for changes the
+    requests must not see halfway.
+    """
+
+    POLL_MS = 25
+
+    def __init__(self, root, max_workers=2, on_progress=None):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tracker-worker")
+        self.on_progress = on_progress
+        self.results = queue.Queue()
+        self.generations = itertools.count()
+        self.latest = {}
+        self.futures = {}
+        self.polling = False
+        # Functions waiting for the running requests to finish, and the
+        # requests submitted meanwhile (the latest per channel)
+        self.idle_calls = []
+        self.held = {}
+
+    def submit(self, channel, func, on_done, on_error=None):
+        """Run func() in the background and call on_done(result) on the Tk thread."""
+        generation = next(self.generations)
+        self.latest[channel] = generation
+
+        previous = self.futures.get(channel)
+        if previous is not None:
+            previous.cancel()
+
+        if self.idle_calls:
+            self.held[channel] = (generation, func, on_done, on_error)
+        else:
+            self.start(channel, generation, func, on_done, on_error)
+        self.report_progress()
+        self.schedule_poll()
+
+    def start(self, channel, generation, func, on_done, on_error):
+        future = self.executor.submit(PROFILER.profile_call, func)
+        self.futures[channel] = future
+        future.add_done_callback(
+            lambda f: self.results.put((channel, generation, f, on_done, on_error))
+        )
+
+    def when_idle(self, func):
+        """Call func() on the Tk thread once every running request has finished.
+
+        Requests submitted meanwhile start after it, so the Tk thread never
+        blocks on a running query.
+        """
+        self.idle_calls.append(func)
+        self.schedule_poll()
+
+    def schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_MS, self.poll)
+
+    def pending(self):
+        """Number of requests that have not finished yet."""
+        return sum(1 for future in self.futures.values() if not future.done()) + len(self.held)
+
+    def report_progress(self):
+        if self.on_progress is not None:
+            self.on_progress(self.pending())
+
+    def poll(self):
+        """Deliver finished results; stale and cancelled requests are dropped."""
+        while True:
+            try:
+                channel, generation, future, on_done, on_error = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if future.cancelled() or generation != self.latest.get(channel):
+                continue
+
+            error = future.exception()
+            if error is None:
+                self.deliver(on_done, future.result())
+            elif on_error is not None:
+                self.deliver(on_error, error)
+
+        if self.idle_calls and all(future.done() for future in self.futures.values()) and self.results.empty():
+            calls, self.idle_calls = self.idle_calls, []
+            for func in calls:
+                self.deliver(func)
+            held, self.held = self.held, {}
+            for channel, request in held.items():
+                self.start(channel, *request)
+
+        self.report_progress()
+        if self.pending() or self.idle_calls or not self.results.empty():
+            self.root.after(self.POLL_MS, self.poll)
+        else:
+            self.polling = False
+
+    def deliver(self, callback, *args):
+        """Call a callback on the Tk thread.
+
+        An exception is reported like any other Tk callback error
+        (report_callback_exception) so it cannot stop the polling loop.
+        """
+        try:
+            callback(*args)
+        except Exception:
+            self.root.report_callback_exception(*sys.exc_info())
+
+    def shutdown(self):
+        """Stop accepting work and drop anything still queued."""
+        for future in self.futures.values():
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+
+class RedrawScheduler:
+    """Coalesce bursts of redraw requests into at most one render per frame interval.
+
+    ``get_key`` describes what the current selection would show; a render
+    whose key matches the one already on screen is skipped unless forced.
+    """
+
+    FRAME_MS = 50
+
+    def __init__(self, root, get_key, render, frame_ms=FRAME_MS):
+        self.root = root
+        self.get_key = get_key
+        self.render = render
+        self.frame_ms = frame_ms
+        self.displayed_key = None
+        self.pending = None
+        self.force = False
+        self.requested = 0
+        self.executed = 0
+        self.skipped = 0
+
+    def request(self, force=False):
+        """Ask for a redraw; requests within one frame interval are merged."""
+        self.requested += 1
+        self.force = self.force or force
+        if self.pending is None:
+            self.pending = self.root.after(self.frame_ms, self.flush)
+
+    def flush(self):
+        """Render the current selection unless it is already displayed."""
+        self.pending = None
+        key = self.get_key()
+        if key == self.displayed_key and not self.force:
+            self.skipped += 1
+            return
+
+        self.force = False
+        self.displayed_key = key
+        self.executed += 1
+        self.render()
+
+    def invalidate(self):
+        """Forget what is on screen so the next request always renders."""
+        self.displayed_key = None
+
+    def stats(self):
+        """Requested vs. executed render counts."""
+        return {"requested": self.requested, "executed": self.executed, "skipped": self.skipped}
+
+
+class SeriesCache:
+    """Bounded LRU cache of derived series keyed by (location, metric, transform).
+
+    Entries are evicted least-recently-used first once their combined size
+    exceeds ``max_bytes``. Cached frames are shared, so callers must not
+    modify them. Safe to use from the background worker threads.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def size_of(value):
+        """Approximate memory footprint of a cached frame or series in bytes."""
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+
+    def get(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store a value for key, replacing any earlier one."""
+        size = self.size_of(value)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self.evictions += 1
+
+    def items(self):
+        """The cached (key, value) pairs, least recently used first."""
+        with self.lock:
+            return [(key, value) for key, (value, _) in self.entries.items()]
+
+    def invalidate(self, location=None):
+        """Drop the entries of one location, or everything when location is None."""
+        with self.lock:
+            for key in [key for key in self.entries if location is None or key[0] == location]:
+                self.nbytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """Drop all entries and reset the statistics."""
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Hit/miss counts and current memory use."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SmoothingEngine:
+    """Rolling means, medians and exponentially weighted averages of a metric
+    for all locations in one pass.
+
+    Like pandas' rolling() on each location's non-null series, windows count
+    reported values and never reach into the previous location. Results are
+    arrays aligned with the frame's rows (NaN where the metric is missing),
+    cached per (metric, method, window).
+    """
+
+    METHODS = ["mean", "median", "ewm"]
+
+    def __init__(self, df, max_bytes=32 * 1024 * 1024):
+        self.df = df
+        self.cache = SeriesCache(max_bytes)
+
+    def smooth(self, metric, method, window):
+        """Smoothed values of a metric for every row of the frame."""
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown smoothing method: {method}")
+        return self.cache.get((metric, method, window), lambda: self.compute(metric, method, window)).to_numpy()
+
+    def update(self, df, insert_at, rows, changed):
+        """Follow a refresh: shift the cached results by the rows inserted at
+        ``insert_at`` and recompute the changed metrics for ``rows`` (whole
+        locations) only.
+        """
+        self.df = df
+        for (metric, method, window), result in self.cache.items():
+            recompute = metric in changed and len(rows)
+            if not len(insert_at) and not recompute:
+                continue
+            values = np.insert(result.to_numpy(), insert_at, np.nan) if len(insert_at) else result.to_numpy().copy()
+            if recompute:
+                values[rows] = self.compute(metric, method, window, rows).to_numpy()
+            self.cache.put((metric, method, window), pd.Series(values))
+
+    @PROFILER.timed("smoothing")
+    def compute(self, metric, method, window, rows=None):
+        """Smoothed values for every row, or for ``rows`` (whole locations, in order)."""
+        column = self.df[metric] if rows is None else self.df[metric].iloc[rows]
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        present = np.flatnonzero(~np.isnan(values))
+        observed = values[present]
+        codes = self.df['location'].cat.codes.to_numpy()
+        groups = (codes if rows is None else codes[rows])[present]
+
+        if method == "mean":
+            # Window sums are differences of one running sum; a window is
+            # complete once it holds `window` values of the same location
+            n = len(observed)
+            first = np.r_[True, groups[1:] != groups[:-1]] if n else np.array([], dtype=bool)
+            run_start = np.maximum.accumulate(np.where(first, np.arange(n), 0)) if n else np.array([], dtype=int)
+            complete = np.flatnonzero(np.arange(n) - run_start >= window - 1)
+            sums = np.r_[0.0, np.cumsum(observed)]
+            smoothed = np.full(n, np.nan)
+            smoothed[complete] = (sums[complete + 1] - sums[complete + 1 - window]) / window
+        else:
+            # Locations are contiguous, so the grouped result keeps row order
+            grouped = pd.Series(observed).groupby(groups, sort=False)
+            if method == "median":
+                smoothed = grouped.rolling(window).median().to_numpy()
+            else:
+                smoothed = grouped.ewm(span=window).mean().to_numpy()
+
+        result = np.full(len(values), np.nan)
+        result[present] = smoothed
+        return pd.Series(result)
+
+
+class DerivedMetrics:
+    """Evaluates derived-metric expressions (see DERIVED_METRICS) over all locations at once.
+
+    Each expression is parsed once into a checked syntax tree, so its input
+    columns are known before it runs. lag() calls look up each row's date
+    minus n days within its location and are evaluated with NumPy;
+    the remaining arithmetic runs through numexpr when it is installed and
+    NumPy otherwise. Results are float arrays aligned with the frame's rows,
+    NaN where an input is missing or a division has no finite result.
+    """
+
+    FUNCTIONS = {"abs": np.abs, "log": np.log, "sqrt": np.sqrt}
+    OPERATORS = {
+        ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+        ast.Div: np.true_divide, ast.Pow: np.power,
+        ast.USub: np.negative, ast.UAdd: np.positive,
+    }
+
+    def __init__(self, expressions=None):
+        self.expressions = dict(DERIVED_METRICS if expressions is None else expressions)
+        self.trees = {}
+
+    def parse(self, name):
+        """Checked syntax tree of a metric's expression."""
+        if name not in self.trees:
+            expression = self.expressions[name]
+            try:
+                tree = ast.parse(expression, mode="eval")
+            except SyntaxError as e:
+                raise ValueError(f"Invalid expression for {name}: {expression}") from e
+            for node in ast.walk(tree):
+                self.check(name, node)
+            self.trees[name] = tree
+        return self.trees[name]
+
+    def check(self, name, node):
+        if isinstance(node, ast.Call):
+            function = node.func.id if isinstance(node.func, ast.Name) else None
+            if function == "lag":
+                ok = (len(node.args) == 2 and not node.keywords and isinstance(node.args[1], ast.Constant)
+                      and isinstance(node.args[1].value, int) and node.args[1].value >= 1)
+            else:
+                ok = function in self.FUNCTIONS and len(node.args) == 1 and not node.keywords
+            if not ok:
+                raise ValueError(f"Unsupported call in {name}: {ast.unparse(node)}")
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                raise ValueError(f"Unsupported constant in {name}: {node.value!r}")
+        elif not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, *self.OPERATORS)):
+            raise ValueError(f"Unsupported syntax in {name}: {type(node).__name__}")
+
+    def inputs(self, name):
+        """Columns a derived metric reads, in order of appearance."""
+        tree = self.parse(name)
+        functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        names = [node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and id(node) not in functions]
+        return list(dict.fromkeys(names))
+
+    def evaluate(self, name, df):
+        """Values of a derived metric for every row of the frame (its inputs must be loaded)."""
+        tree = copy.deepcopy(self.parse(name))
+        missing = [column for column in self.inputs(name) if column not in df.columns]
+        if missing:
+            raise ValueError(f"{name} needs the {', '.join(missing)} column(s)")
+        arrays = {column: df[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in self.inputs(name)}
+        # (location, date) keys, so lag() finds the row n days earlier
+        keys = row_keys(df['location'].cat.codes.to_numpy(), df['date'].to_numpy())
+        with np.errstate(all="ignore"):
+            if numexpr is not None:
+                body = self.bind_lags(tree.body, arrays, keys)
+                values = numexpr.evaluate(ast.unparse(body), local_dict=arrays)
+            else:
+                values = self.evaluate_node(tree.body, arrays, keys)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), (len(df),)).copy()
+        values[~np.isfinite(values)] = np.nan
+        return values
+
+    def evaluate_node(self, node, arrays, keys):
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return arrays[node.id]
+        if isinstance(node, ast.UnaryOp):
+            return self.OPERATORS[type(node.op)](self.evaluate_node(node.operand, arrays, keys))
+        if isinstance(node, ast.BinOp):
+            left = self.evaluate_node(node.left, arrays, keys)
+            right = self.evaluate_node(node.right, arrays, keys)
+            return self.OPERATORS[type(node.op)](left, right)
+        if node.func.id == "lag":
+            return self.lag(self.evaluate_node(node.args[0], arrays, keys), keys, node.args[1].value)
+        return self.FUNCTIONS[node.func.id](self.evaluate_node(node.args[0], arrays, keys))
+
+    def bind_lags(self, node, arrays, keys):
+        """Replace lag() calls by names bound in arrays (numexpr has no shift)."""
+        if isinstance(node, ast.Call) and node.func.id == "lag":
+            name = f"lag_{len(arrays)}__"
+            arrays[name] = self.evaluate_node(node, arrays, keys)
+            return ast.Name(id=name, ctx=ast.Load())
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, ast.AST):
+                setattr(node, field, self.bind_lags(value, arrays, keys))
+            elif isinstance(value, list):
+                setattr(node, field, [self.bind_lags(item, arrays, keys) for item in value])
+        return node
+
+    @staticmethod
+    def lag(values, keys, n):
+        """Values of the same location n days earlier (NaN where it has no row for that date).
+
+        ``keys`` are the rows' row_keys, so a date gap is not mistaken for a day.
+        """
+        values = np.broadcast_to(values, keys.shape)
+        shifted = np.full(len(keys), np.nan)
+        if len(keys):
+            order = np.argsort(keys, kind="stable")
+            targets = keys - n
+            found = order[np.minimum(np.searchsorted(keys, targets, sorter=order), len(keys) - 1)]
+            hit = keys[found] == targets
+            shifted[hit] = values[found[hit]]
+        return shifted
+
+
+class ColumnStore:
+    """Pages columns into a frame from the columnar cache the first time they are needed.
+
+    The frame starts with only the key columns; ``require`` adds the others
+    in place, so row slices taken afterwards include them. With ``compact``
+    they are converted to compact storage as they arrive (see compact_storage).
+    Refreshes merged since the store was created are replayed on each column
+    as it is loaded (see RowPatch); once every column is loaded they are dropped.
+    """
+
+    def __init__(self, df, cache, available, compact=False):
+        self.df = df
+        self.cache = cache
+        self.available = set(available)
+        self.compact = compact
+        self.storage_report = {}
+        # Also guards every other change to the frame (see CovidDataset.frame_lock)
+        self.lock = threading.RLock()
+        # Rows of the cached columns and the refresh patches to apply to them, in order
+        self.cached_rows = len(df)
+        self.patches = []
+
+    def missing(self, columns):
+        return [c for c in dict.fromkeys(columns) if c in self.available and c not in self.df.columns]
+
+    def load(self, columns):
+        """Read columns from the cache, with the refreshes merged since then, as a dict of series."""
+        loaded = self.cache.load(columns)
+        if loaded is None or len(loaded) != self.cached_rows:
+            raise RuntimeError("The data file changed since it was loaded; restart the tracker to reload it.")
+        merged = {}
+        for column in columns:
+            values = loaded[column]
+            for patch in self.patches:
+                patched = patch.apply(column, values)
+                if patched is not None:
+                    values = pd.Series(patched)
+            merged[column] = values
+        return merged
+
+    def require(self, columns):
+        """Make sure the given columns are in the frame (unknown columns are ignored)."""
+        if not self.missing(columns):
+            return
+
+        with self.lock:
+            missing = self.missing(columns)
+            if not missing:
+                return
+            with PROFILER.stage("load_columns"):
+                loaded = self.load(missing)
+            for column in missing:
+                self.df[column] = loaded[column]
+            if self.compact:
+                self.storage_report.update(compact_storage(self.df, missing))
+            if not self.lazy_columns():
+                self.patches = []
+
+    def lazy_columns(self):
+        """Columns that can still be loaded."""
+        return sorted(self.available.difference(self.df.columns))
+
+    def switch(self, df, patch):
+        """Continue on a refreshed frame; columns loaded later get patch applied too."""
+        with self.lock:
+            self.df = df
+            lazy = self.lazy_columns()
+            if lazy:
+                self.patches.append(patch.select(lazy))
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process in bytes, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def read_csv_chunked(csv_path, columns, chunksize=100_000):
+    """Stream the CSV in chunks, keeping only ``columns`` and compacting each chunk.
+
+    Only one raw chunk is held in memory at a time; the compact pieces are
+    joined column by column at the end.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [column for column in columns if column in header]
+    dtypes = {
+        column: str if column in CATEGORICAL_COLUMNS else "float64"
+        for column in usecols if column != "date"
+    }
+
+    pieces = {column: [] for column in usecols}
+    for chunk in pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        compact = compact_frame(chunk)
+        for column in usecols:
+            pieces[column].append(compact[column].array)
+
+    joined = {}
+    for column in usecols:
+        parts = pieces.pop(column)
+        if column in CATEGORICAL_COLUMNS:
+            joined[column] = pd.api.types.union_categoricals(parts, sort_categories=True)
+        elif parts:
+            # float32 and float64 chunks are joined as float64 so no value loses precision
+            joined[column] = np.concatenate([np.asarray(part) for part in parts])
+        else:
+            joined[column] = np.array([], dtype=np.float32)
+    return pd.DataFrame(joined)
+
+
+def load_dataset(csv_path=DATA_FILE, use_cache=True, low_memory=False):
+    """Load the OWID dataset, using the columnar cache when it is up to date.
+
+    In ``low_memory`` mode only the columns the views read (see view_columns)
+    are loaded, and the CSV is streamed in chunks instead of parsed at once.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(csv_path)
+
+    columns = view_columns() if low_memory else None
+    cache = DatasetCache(csv_path)
+    if use_cache:
+        df = cache.load(columns)
+        if df is not None:
+            return df
+
+    if low_memory:
+        df = sort_by_location(read_csv_chunked(csv_path, columns))
+    else:
+        df = sort_by_location(compact_frame(pd.read_csv(csv_path, low_memory=False)))
+    if use_cache:
+        cache.store(df, complete=not low_memory)
+    return df
+
+
+def row_keys(location_codes, dates):
+    """Sortable int64 keys of (location code, date) pairs, ordered like sort_by_location."""
+    days = np.asarray(dates).astype("datetime64[D]").astype(np.int64)
+    return np.asarray(location_codes).astype(np.int64) * (1 << 32) + days
+
+
+def extend_categories(series, values):
+    """Categorical dtype of series with any unseen values appended, so existing codes stay valid."""
+    categories = series.cat.categories
+    unseen = pd.Index(values.dropna().astype(object).unique()).difference(categories)
+    return pd.CategoricalDtype(categories.append(unseen))
+
+
+def revised_values(current, incoming):
+    """Which incoming values differ from the current ones (missing on both sides counts as equal).
+
+    A value that matches the current one once rounded to float32 is not a
+    revision: float32 columns hold values rounded like that (see
+    downcast_metric), and keep them after a refresh widens the column.
+    """
+    changed = (current != incoming) & ~(np.isnan(current) & np.isnan(incoming))
+    changed[changed] = current[changed] != incoming[changed].astype(np.float32)
+    return changed
+
+
+class RowPatch:
+    """The rows a refresh inserts and the values it revises, applied one column at a time.
+
+    ``insert_at`` holds the positions (in the frame before the refresh) the
+    new rows go in front of, as np.insert takes them. ``columns`` maps each
+    column the refresh has values for to the values of the inserted rows
+    (None when it has none) and the positions and new values of the rows it
+    revises. Only those rows are kept, so a patch stays small however large
+    the frame is.
+    """
+
+    def __init__(self, insert_at, columns):
+        self.insert_at = insert_at
+        self.columns = columns
+
+    def select(self, columns):
+        """The patch restricted to some columns."""
+        return RowPatch(self.insert_at, {column: self.columns[column] for column in columns if column in self.columns})
+
+    def apply(self, column, old):
+        """Values of a column after the refresh (``old`` holds them before), or None when they are unchanged."""
+        inserted, targets, revised = self.columns.get(column, (None, np.array([], dtype=np.intp), None))
+        if not len(self.insert_at) and not len(targets):
+            return None
+
+        categorical = isinstance(old.dtype, pd.CategoricalDtype)
+        if categorical:
+            # Work on int32 codes; appended categories leave the old codes unchanged
+            incoming = [part for part in (inserted, revised) if part is not None]
+            dtype = extend_categories(old, pd.Series(np.concatenate(incoming), dtype=object)) if incoming else old.dtype
+            values = old.cat.codes.to_numpy().astype(np.int32)
+            encode = lambda items: pd.Categorical(items, dtype=dtype).codes.astype(np.int32)
+            missing = -1
+        elif old.dtype.kind == "M":
+            values = old.to_numpy()
+            encode = lambda items: np.asarray(items, dtype=values.dtype)
+            missing = np.datetime64("NaT")
+        else:
+            # Widen float32 columns when the new values need float64 to stay exact
+            values = dense_values(old).astype(stored_dtype(old.dtype), copy=False)
+            incoming = [part for part in (inserted, revised) if part is not None and len(part)]
+            if incoming:
+                values = values.astype(np.result_type(values.dtype, downcast_metric(np.concatenate(incoming)).dtype), copy=False)
+            encode = lambda items: np.asarray(items, dtype=values.dtype)
+            missing = np.nan
+
+        if len(targets):
+            values = values.copy()
+            values[targets] = encode(revised)
+        if len(self.insert_at):
+            values = np.insert(values, self.insert_at, encode(inserted) if inserted is not None else missing)
+        return pd.Categorical.from_codes(values, dtype=dtype) if categorical else values
+
+
+def merge_delta(df, index, delta, lazy_columns=None, load_columns=None):
+    """Match newer OWID rows against a frame sorted by (location, date).
+
+    ``delta`` is a raw frame from a full OWID CSV or a delta file with some of
+    its rows and columns; it needs ``iso_code`` and ``date``, plus ``location``
+    for ISO codes that are not loaded yet. Rows are matched by (iso_code, date):
+    known rows take the delta's values for the columns it has, other rows are
+    inserted in place and new locations go after the existing ones. Columns
+    the frame does not have are ignored.
+
+    ``lazy_columns`` are columns that are not in the frame yet but can be
+    loaded with ``load_columns(columns)`` (as a dict of series in the frame's
+    row order). Those the delta has are loaded to find their revisions (from
+    the cache, only the matched rows are read), and the patch covers them too.
+
+    Returns a RowPatch with the changes (None when nothing changed) and a
+    summary with the number of added and revised rows, the locations they
+    belong to, the rows added per location and the columns whose values
+    changed. Only the matched rows are read, so the cost follows the size of
+    the delta rather than of the frame.
+    """
+    if "iso_code" not in delta.columns or "date" not in delta.columns:
+        raise ValueError("The refresh file needs iso_code and date columns")
+    delta = delta.dropna(subset=["iso_code", "date"])
+    dates = pd.to_datetime(delta["date"], format="%Y-%m-%d").to_numpy().astype("datetime64[ns]")
+
+    # Known ISO codes resolve to the loaded location name; new ones need a name
+    iso_codes = df['iso_code'].to_numpy()[index.starts]
+    known = {iso: location for iso, location in zip(iso_codes, index.locations) if not pd.isna(iso)}
+    location = delta["iso_code"].astype(object).map(known).astype(object)
+    if "location" in delta.columns:
+        location = location.fillna(delta["location"].astype(object))
+    if location.isna().any():
+        raise ValueError(f"{int(location.isna().sum())} rows have a new iso_code but no location name")
+
+    location_dtype = extend_categories(df['location'], location)
+    new_keys = row_keys(pd.Categorical(location, dtype=location_dtype).codes, dates)
+    order = np.argsort(new_keys, kind="stable")
+    new_keys = new_keys[order]
+    # A key listed twice keeps its last row
+    last = np.r_[new_keys[1:] != new_keys[:-1], True]
+    order, new_keys = order[last], new_keys[last]
+
+    # Both key arrays are sorted, so one searchsorted finds every match and
+    # every insertion point
+    old_keys = row_keys(df['location'].cat.codes.to_numpy(), df['date'].to_numpy())
+    positions = np.searchsorted(old_keys, new_keys)
+    matched = np.zeros(len(new_keys), dtype=bool)
+    inside = positions < len(old_keys)
+    matched[inside] = old_keys[positions[inside]] == new_keys[inside]
+    targets = positions[matched]
+    added = ~matched
+
+    locations = location.to_numpy()[order]
+    given = {"location": locations, "date": dates[order]}
+    columns = {}
+    revised = np.zeros(len(targets), dtype=bool)
+    changed_columns = set()
+    lazy_columns = [column for column in lazy_columns or [] if column in delta.columns and column not in df.columns]
+    lazy = load_columns(lazy_columns) if lazy_columns else {}
+    for column in list(df.columns) + lazy_columns:
+        if column not in given and column not in delta.columns:
+            continue
+
+        old = df[column] if column in df.columns else lazy.pop(column)
+        if column in given:
+            new = given[column]
+        elif isinstance(old.dtype, pd.CategoricalDtype):
+            new = delta[column].to_numpy(dtype=object)[order]
+        else:
+            new = pd.to_numeric(delta[column]).to_numpy(dtype=np.float64, na_value=np.nan)[order]
+
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            current, incoming = old.iloc[targets].to_numpy(dtype=object), new[matched]
+            changed = (current != incoming) & ~(pd.isna(current) & pd.isna(incoming))
+        elif old.dtype.kind == "M":
+            # Matched rows have the same date
+            changed = np.zeros(len(targets), dtype=bool)
+        else:
+            # Reading only the matched rows keeps memory-mapped columns on disk
+            current = dense_values(old.iloc[targets]) if is_compact_storage(old.dtype) else old.to_numpy()[targets]
+            changed = revised_values(current.astype(np.float64), new[matched])
+
+        inserted = new[added]
+        columns[column] = (inserted, targets[changed], new[matched][changed])
+        revised |= changed
+        if changed.any() or not pd.isna(inserted).all():
+            changed_columns.add(column)
+
+    summary = {
+        "added": int(added.sum()),
+        "revised": int(revised.sum()),
+        "locations": set(locations[added]) | set(locations[matched][revised]),
+        "added_rows": Counter(locations[added]),
+        "columns": changed_columns,
+    }
+    if not summary["added"] and not summary["revised"]:
+        return None, summary
+    return RowPatch(positions[added], columns), summary
+
+
+class CovidDataset:
+    """The loaded OWID data together with the lookup structures built on it.
+
+    Holds no UI state, so the Tk window and the headless renderer share the
+    same queries. All methods are safe to call from worker threads, except
+    apply_refresh, which must not run while other queries do.
+    """
+
+    def __init__(self, df, load_info=None, column_store=None, compact=False):
+        self.df = df
+        # Sparse and nullable integer storage for the metric columns (see compact_storage)
+        self.compact = compact
+        self.storage_report = compact_storage(df) if compact else {}
+        # Loads the remaining columns on demand (None when all are in memory)
+        self.column_store = column_store
+        # How the data was loaded: rows, seconds, peak_rss (bytes, may be None)
+        self.load_info = load_info or {}
+        # Per-location row ranges for O(1) lookups
+        self.index = LocationIndex(df)
+        # Kind of each location and continent membership
+        self.geography = Geography(df, self.index)
+        # Latest values shared by the ranking and stats views
+        self.snapshot = LatestSnapshot(df, self.index, self.geography)
+        # Derived series (per location, metric and transform)
+        self.series_cache = SeriesCache()
+        # Smoothed metrics for all locations (per metric, method and window)
+        self.smoothing = SmoothingEngine(df)
+        # Derived metrics, added to the frame as columns the first time a view requires them
+        self.derived = DerivedMetrics()
+        # Held for every change to the frame: lazily loaded columns, derived
+        # columns and refreshes. Shared with the column store.
+        self.frame_lock = column_store.lock if column_store is not None else threading.RLock()
+        # Get list of countries (excluding continents and income groups)
+        self.countries = sorted(self.geography.locations("country"))
+        # Bumped whenever the data changes, so derived responses can be revalidated
+        self.version = 0
+
+    @classmethod
+    @PROFILER.timed("load")
+    def load(cls, csv_path=DATA_FILE, use_cache=True, low_memory=False, lazy=False, compact=False):
+        """Load the dataset (served from the columnar cache after the first run).
+
+        With ``lazy`` and an up-to-date cache, only the key columns are read
+        now and every other column is paged in the first time a view needs it.
+        ``compact`` keeps the metric columns in compact storage.
+        """
+        start = time.perf_counter()
+        df = column_store = None
+        if lazy and use_cache:
+            cache = DatasetCache(csv_path)
+            available = cache.cached_columns()
+            if low_memory:
+                wanted = set(view_columns())
+                available = [column for column in available if column in wanted]
+            df = cache.load(KEY_COLUMNS) if available else None
+            if df is not None:
+                column_store = ColumnStore(df, cache, available, compact)
+        if df is None:
+            df = load_dataset(csv_path, use_cache, low_memory)
+        
+        load_info = {
+            "rows": len(df),
+            "columns": len(df.columns),
+            "seconds": time.perf_counter() - start,
+            "peak_rss": peak_rss_bytes(),
+            "low_memory": low_memory,
+            "lazy": column_store is not None,
+            "compact": compact,
+        }
+        return cls(df, load_info, column_store, compact)
+
+    def describe_load(self):
+        """One-line summary of how the data was loaded, for the status bar."""
+        info = self.load_info
+        if not info:
+            return "Ready"
+        summary = f"Loaded {info['rows']:,} rows x {info['columns']} columns in {info['seconds']:.1f}s"
+        if info.get("peak_rss"):
+            summary += f" (peak memory {info['peak_rss'] / 2**20:,.0f} MB)"
+        if self.compact:
+            summary += "; compact storage"
+            report = self.memory_report()
+            if report:
+                saved = sum(entry["before"] - entry["after"] for entry in report.values())
+                summary += f" saved {saved / 2**20:,.1f} MB"
+        return summary
+
+    def memory_report(self):
+        """Storage chosen for each compacted column with its bytes before and after."""
+        report = dict(self.storage_report)
+        if self.column_store is not None:
+            report.update(self.column_store.storage_report)
+        return report
+
+    def require(self, columns):
+        """Make sure columns are in the frame before a view reads them.
+
+        Lazily loaded columns are paged in, and derived metrics are computed
+        (after their inputs) and kept as columns of the frame.
+        """
+        if not self.missing(columns):
+            return
+        with self.frame_lock:
+            if self.column_store is not None:
+                self.column_store.require(columns)
+            for name in self.missing(columns):
+                # Only derived metrics are left
+                self.require(self.derived.inputs(name))
+                with PROFILER.stage("derived_metric"):
+                    self.df[name] = downcast_metric(self.derived.evaluate(name, self.df))
+                if self.compact:
+                    self.storage_report.update(compact_storage(self.df, [name]))
+
+    def missing(self, columns):
+        """Columns that can be loaded or derived but are not in the frame yet."""
+        lazy = self.column_store.available if self.column_store is not None else ()
+        return [column for column in dict.fromkeys(columns) if column not in self.df.columns
+                and (column in lazy or column in self.derived.expressions)]
+
+    def prepare_refresh(self, csv_path):
+        """Merge a newer CSV (or a delta file) with the loaded rows (see merge_delta).
+
+        The loaded data is only read here, so this can run on a worker thread
+        while other queries run. The new values of the changed columns (every
+        column when rows are added) are prepared here for apply_refresh.
+        Columns that are not loaded yet stay lazy.
+        """
+        start = time.perf_counter()
+        lazy_columns = self.column_store.lazy_columns() if self.column_store is not None else []
+        columns = set(self.df.columns) | set(lazy_columns)
+        delta = pd.read_csv(csv_path, usecols=lambda column: column in columns, low_memory=False)
+        with self.frame_lock:
+            # Columns added meanwhile would be missing from the merged values
+            patch, summary = merge_delta(self.df, self.index, delta, lazy_columns,
+                                         self.column_store.load if self.column_store is not None else None)
+            if patch is not None:
+                merged = {column: patch.apply(column, self.df[column]) for column in self.df.columns}
+        summary["patch"] = patch
+        if patch is not None:
+            update = pd.DataFrame({column: values for column, values in merged.items() if values is not None}, copy=False)
+            if self.compact:
+                # The merged columns come back dense
+                summary["storage_report"] = compact_storage(update)
+            summary["update"] = update
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+
+    def apply_refresh(self, refresh):
+        """Apply the changes prepared by prepare_refresh and drop the stale cached series.
+
+        Everything built on the frame is updated in place: the index shifts
+        its row ranges, the snapshot rereads one row per location, and
+        derived columns and cached smoothing results are recomputed for the
+        touched locations only. Queries running meanwhile could pair the new
+        frame with the old row ranges, so the caller must make sure none do
+        (the tracker runs this once its background queries have finished).
+        """
+        patch = refresh["patch"]
+        if patch is None:
+            return
+        with self.frame_lock:
+            update = refresh["update"]
+            # Columns loaded or derived since prepare_refresh are patched now
+            late = {}
+            for column in self.df.columns:
+                if column not in update.columns and (len(patch.insert_at) or column in patch.columns):
+                    values = patch.apply(column, self.df[column])
+                    if values is not None:
+                        late[column] = values
+            if len(patch.insert_at):
+                # Every column has new rows
+                self.df = update.assign(**late)[list(self.df.columns)]
+            else:
+                for column, values in list(update.items()) + list(late.items()):
+                    self.df[column] = values
+            if self.compact:
+                self.storage_report.update(refresh["storage_report"])
+                self.storage_report.update(compact_storage(self.df, list(late)))
+
+            known = len(self.index.locations)
+            self.index.insert_rows(self.df, refresh["added_rows"])
+            if len(self.index.locations) > known:
+                self.geography.update(self.df)
+            # Rows of the touched locations, which derived columns and smoothing recompute
+            bounds = [self.index.location_slice(location) for location in refresh["locations"]]
+            rows = np.concatenate([np.arange(b.start, b.stop) for b in sorted(bounds, key=lambda b: b.start)] or [[]]).astype(np.intp)
+            changed = refresh["columns"] | self.refresh_derived(rows)
+            self.snapshot.update(self.df, changed if len(self.index.locations) == known else None)
+            self.smoothing.update(self.df, patch.insert_at, rows, changed)
+            if self.column_store is not None:
+                self.column_store.switch(self.df, patch)
+        for location in refresh["locations"]:
+            self.series_cache.invalidate(location)
+        self.countries = sorted(self.geography.locations("country"))
+        self.version += 1
+
+    def refresh_derived(self, rows):
+        """Recompute the derived columns for some rows (whole locations) and return their names."""
+        names = [column for column in self.df.columns if column in self.derived.expressions]
+        if not len(rows):
+            return set()
+        for name in names:
+            part = self.df[['location', 'date'] + self.derived.inputs(name)].iloc[rows]
+            values = self.df[name].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+            values[rows] = self.derived.evaluate(name, part)
+            self.df[name] = downcast_metric(values)
+            if self.compact:
+                self.storage_report.update(compact_storage(self.df, [name]))
+        return set(names)
+
+    def date_range(self, days=None, start=None, end=None):
+        """Resolve the last ``days`` days of data, or explicit start/end dates, to a (start, end) range.
+
+        Returns None (every date) when nothing is given. Raises ValueError for unparseable dates.
+        """
+        if days is not None:
+            end = self.snapshot.last_date
+            return (end - pd.Timedelta(days=days - 1), end) if end is not None else None
+        if start is None and end is None:
+            return None
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        return start, end
+
+    def has_column(self, column):
+        """Whether a column is in the frame or can be loaded into it."""
+        if column in self.df.columns or column in self.derived.expressions:
+            return True
+        return self.column_store is not None and column in self.column_store.available
+
+    def location_slice(self, country):
+        """Row slice of a country (or the World aggregate) in the current frame."""
+        if country == "World":
+            return self.index.iso_slice('OWID_WRL')
+        return self.index.location_slice(country)
+
+    def location_rows(self, country):
+        """Get the date-sorted rows of a country (or the World aggregate).
+
+        Rows are not copied, except compact storage columns, which become dense.
+        """
+        return densify(self.df.iloc[self.location_slice(country)])
+
+    def get_country_series(self, country, metric, transform="dropna"):
+        """Get a cached series for a country: "raw" or "dropna"."""
+        if transform == "raw":
+            self.require([metric])
+            compute = lambda: self.location_rows(country)[['date', metric]]
+        elif transform == "dropna":
+            # Filter out rows where the metric is NaN
+            compute = lambda: self.get_country_series(country, metric, "raw").dropna(subset=[metric])
+        else:
+            raise ValueError(f"Unknown transform: {transform}")
+        
+        return self.series_cache.get((country, metric, transform), compute)
+
+    @PROFILER.timed()
+    def get_country_data(self, country, metric):
+        """Get data for a specific country and metric."""
+        data = self.get_country_series(country, metric)
+        
+        # Replace metric name for better display
+        readable_metric = metric_info(metric).label
+        
+        return data, readable_metric
+
+    def location_matrix(self, locations, metric, date_range=None, values=None):
+        """Build a date x location matrix of a metric in one pass over the locations' rows.
+
+        Returns the sorted union of their dates (within date_range) and a
+        float array with one column per location, NaN where a location has
+        no row for a date. ``values`` (aligned with the frame's rows, e.g. a
+        smoothed metric) replaces the metric's own values.
+        """
+        all_dates = self.df['date'].to_numpy()
+        bounds = []
+        for location in locations:
+            bound = self.index.location_slice(location)
+            visible = date_slice(all_dates[bound], date_range)
+            bounds.append(slice(bound.start + visible.start, bound.start + visible.stop))
+        lengths = [bound.stop - bound.start for bound in bounds]
+        positions = np.concatenate([np.arange(bound.start, bound.stop) for bound in bounds] + [np.array([], dtype=int)])
+        columns = np.repeat(np.arange(len(bounds)), lengths)
+        
+        # Only the selected rows of a compact column are made dense
+        picked = dense_values(self.df[metric].iloc[positions]) if values is None else values[positions]
+        dates, rows = np.unique(all_dates[positions], return_inverse=True)
+        matrix = np.full((len(dates), len(bounds)), np.nan)
+        matrix[rows, columns] = picked
+        return pd.DatetimeIndex(dates), matrix
+
+    def prepare_overlay(self, locations, metric, per_capita=False, method="mean", window=None, date_range=None):
+        """Run the data queries for several locations' series on one graph.
+
+        Returns their date x location matrix (see location_matrix), smoothed
+        when ``window`` is a number. ``per_capita`` divides each column by
+        the location's population, per million people; metrics that are
+        already rates or per-population values are left as they are.
+        """
+        self.require([metric])
+        locations = [location for location in dict.fromkeys(locations) if location in self.index.by_location]
+        readable_metric = metric_info(metric).label
+        
+        values = None
+        smoothing = None
+        if window not in (None, "auto"):
+            values = self.smoothing.smooth(metric, method, window)
+            smoothing = f"{window}-day {SMOOTHING_LABELS[method]}"
+        dates, matrix = self.location_matrix(locations, metric, date_range, values)
+        
+        normalized = per_capita and not is_normalized(metric)
+        if normalized:
+            self.require(["population"])
+            population = self.snapshot.last_valid("population").reindex(locations).to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                matrix = matrix / np.where(population > 0, population, np.nan) * 1e6
+            readable_metric += " per Million"
+        
+        return {
+            "locations": locations,
+            "dates": dates,
+            "values": matrix,
+            "readable_metric": readable_metric,
+            "per_capita": normalized,
+            "smoothing": smoothing,
+        }
+
+    @PROFILER.timed()
+    def prepare_graph(self, country, metric, compare, method="mean", window="auto", date_range=None,
+                      overlay=None, per_capita=False):
+        """Run the data queries for the main graph.
+
+        ``window`` is a number of reported values, None for no smoothing, or
+        "auto" for a short moving average on the single-country view only.
+        ``date_range`` limits the single-country view to (start, end); the
+        average is still computed over the full history. A non-empty
+        ``overlay`` list draws those locations together instead of
+        ``country`` (see prepare_overlay).
+        """
+        graph = {"country": country, "metric": metric, "compare": compare}
+        self.require([metric])
+        
+        if not compare and overlay:
+            graph["overlay"] = self.prepare_overlay(overlay, metric, per_capita, method, window, date_range)
+        elif compare:
+            smoothed = None
+            if window not in (None, "auto"):
+                # Rank the countries by their smoothed values
+                smoothed = self.smoothing.smooth(metric, method, window)
+                graph["smoothing"] = f"{window}-day {SMOOTHING_LABELS[method]}"
+            graph["top_data"] = self.snapshot.top_countries(metric, 10, smoothed)
+        else:
+            country_data, readable_metric = self.get_country_data(country, metric)
+            visible = date_slice(country_data['date'].to_numpy(), date_range)
+            graph["country_data"] = country_data.iloc[visible]
+            graph["readable_metric"] = readable_metric
+            
+            # Add a slight smoothing for visual appeal
+            if window == "auto":
+                window = min(7, len(country_data) // 10) if len(country_data) > 30 else None
+            if window:
+                graph["smoothing"] = f"{window}-day {SMOOTHING_LABELS[method]}"
+                # Row positions of country_data in the current frame. The cached
+                # frame's own index can be stale: a refresh shifts the rows of
+                # locations sorted after the ones it inserted into.
+                bounds = self.location_slice(country)
+                present = ~np.isnan(np.asarray(dense_values(self.df[metric].iloc[bounds]), dtype=np.float64))
+                positions = np.arange(bounds.start, bounds.stop)[present][visible]
+                graph["rolling_avg"] = self.smoothing.smooth(metric, method, window)[positions]
+        
+        return graph
+
+    @PROFILER.timed()
+    def prepare_vaccination_data(self, metric, continent, date_range=None):
+        """Run the data queries for the vaccination graph (date_range limits the timeline)."""
+        self.require([metric])
+        
+        # Format metric for display
+        if metric == "people_vaccinated_per_hundred":
+            metric_title = "At Least One Dose"
+        elif metric == "people_fully_vaccinated_per_hundred":
+            metric_title = "Fully Vaccinated"
+        elif metric == "total_boosters_per_hundred":
+            metric_title = "Boosters"
+        else:
+            metric_title = metric_info(metric).label
+            
+        # Latest reported value for each country (continents, world, and income groups excluded)
+        selected = self.geography.is_country
+        if continent != "All":
+            selected = selected & self.geography.continent_mask(continent)
+        latest_values = self.snapshot.last_valid(metric)[selected].dropna()
+        
+        # Sort by the metric and get top countries
+        top_countries = pd.DataFrame(columns=['location', metric])
+        if not latest_values.empty:
+            top_countries = latest_values.nlargest(15).rename_axis('location').reset_index(name=metric)
+        
+        # Create timeline for selected countries or regions
+        if continent == "All":
+            # Show global and continent trends (income groups excluded)
+            timeline_locations = self.geography.locations("world", "continent", "aggregate")
+        elif not top_countries.empty:
+            # Show selected continent and its top countries
+            timeline_locations = [continent] + top_countries.head(5)['location'].tolist()
+        else:
+            timeline_locations = []
+        
+        # One date x location matrix; locations without any value are left out
+        dates, values = self.location_matrix(timeline_locations, metric, date_range)
+        has_data = ~np.isnan(values).all(axis=0)
+        
+        return {
+            "metric": metric,
+            "metric_title": metric_title,
+            "top_countries": top_countries,
+            "timeline": {
+                "dates": dates,
+                "locations": [location for location, keep in zip(timeline_locations, has_data) if keep],
+                "values": values[:, has_data],
+            },
+        }
+
+
+def current_stats_rows(data):
+    """Pre-formatted rows of the "Current Stats" tab for a one-row frame.
+
+    Returns (section, [(label, value), ...]) pairs; missing values are left
+    out, so a section can be empty.
+    """
+    formatted = format_frame(data, [metric for _, metrics in STATS_SECTIONS for metric in metrics]).iloc[0]
+    sections = []
+    for section_name, metrics in STATS_SECTIONS:
+        rows = [
+            (metric_info(metric).label, formatted[metric])
+            for metric in metrics
+            if metric in formatted.index and not pd.isna(formatted[metric])
+        ]
+        sections.append((section_name, rows))
+    return sections
+
+
+def minmax_indices(values, buckets):
+    """Indices of the points to draw when a series is reduced to `buckets` buckets.
+
+    Each bucket keeps its lowest and highest point, so peaks survive, and the
+    first and last points are always kept. Short series are kept whole.
+    """
+    n = len(values)
+    if n <= 2 * buckets + 2:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.r_[edges, n]))
+    # Missing values never win; an all-missing bucket keeps one point (a gap)
+    high = np.where(np.isnan(values), -np.inf, values)
+    low = np.where(np.isnan(values), np.inf, values)
+    is_max = high == np.maximum.reduceat(high, edges)[bucket]
+    is_min = low == np.minimum.reduceat(low, edges)[bucket]
+
+    # First matching point of each bucket
+    max_positions = np.flatnonzero(is_max)
+    min_positions = np.flatnonzero(is_min)
+    max_positions = max_positions[np.unique(bucket[max_positions], return_index=True)[1]]
+    min_positions = min_positions[np.unique(bucket[min_positions], return_index=True)[1]]
+    return np.unique(np.r_[0, max_positions, min_positions, n - 1])
+
+
+class DecimatedLine:
+    """Draws a long series through a min/max-decimated copy sized to the axes width.
+
+    The full data is kept, and the visible part is decimated again whenever
+    the x-limits change, so zooming in brings the detail back.
+    """
+
+    DEFAULT_WIDTH = 1000
+
+    def __init__(self, line):
+        self.line = line
+        self.x = np.array([], dtype="datetime64[ns]")
+        self.y = np.array([])
+        self.xnum = np.array([])
+        self.cid = line.axes.callbacks.connect("xlim_changed", lambda ax: self.resolve())
+
+    def set_data(self, x, y):
+        """Replace the full data and draw all of it decimated."""
+        self.x = np.asarray(x)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.xnum = mdates.date2num(self.x) if len(self.x) else np.array([])
+        self.show(0, len(self.x))
+
+    def resolve(self):
+        """Decimate the points inside the current x-limits (plus one on each side)."""
+        left, right = self.line.axes.get_xlim()
+        lo = max(np.searchsorted(self.xnum, left) - 1, 0)
+        hi = min(np.searchsorted(self.xnum, right, side="right") + 1, len(self.xnum))
+        self.show(lo, hi)
+
+    def show(self, lo, hi):
+        width = self.line.axes.get_window_extent().width
+        buckets = int(width) if width > 1 else self.DEFAULT_WIDTH
+        keep = lo + minmax_indices(self.y[lo:hi], buckets)
+        self.line.set_data(self.x[keep], self.y[keep])
+
+    def remove(self):
+        """Take the line off its axes and stop following the x-limits."""
+        self.line.axes.callbacks.disconnect(self.cid)
+        self.line.remove()
+
+
+def plot_decimated(ax, x, y, **kwargs):
+    """ax.plot for one long series, drawn through a DecimatedLine."""
+    line, = ax.plot([], [], **kwargs)
+    DecimatedLine(line).set_data(x, y)
+    ax.relim()
+    ax.autoscale_view()
+    return line
+
+
+def format_date_axis(ax, dates, interval=3):
+    """Label a date x-axis every few months, or automatically for spans under six months."""
+    dates = np.asarray(dates)
+    if len(dates) and dates[-1] - dates[0] < np.timedelta64(183, "D"):
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b %Y'))
+    else:
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=interval))
+
+
+def plot_country_view(ax, graph):
+    """Create the line artists of the single-country view and return them."""
+    line, = ax.plot([], [], linewidth=2, marker='', color='#3498db')
+    avg_line, = ax.plot([], [], linewidth=3, color='#e74c3c')
+    # Long histories are drawn decimated to the axes width
+    line_data = DecimatedLine(line)
+    avg_data = DecimatedLine(avg_line)
+    ax.set_xlabel("Date", fontsize=12)
+    
+    # Add grid
+    ax.grid(True, linestyle='--', alpha=0.7)
+    
+    view = {"ax": ax, "line": line, "avg_line": avg_line, "line_data": line_data, "avg_data": avg_data}
+    update_country_view(view, graph)
+    return view
+
+
+def update_country_view(view, graph):
+    """Point the persistent single-country artists at new data and rescale."""
+    ax = view["ax"]
+    country_data = graph["country_data"]
+    metric = graph["metric"]
+    readable_metric = graph["readable_metric"]
+
+    view["line_data"].set_data(country_data['date'], country_data[metric])
+    format_date_axis(ax, country_data['date'])
+    ax.set_title(f"{readable_metric} in {graph['country']}", fontsize=16)
+    ax.set_ylabel(readable_metric, fontsize=12)
+    view["metric"] = metric
+
+    # Add a slight smoothing for visual appeal
+    avg_line = view["avg_line"]
+    if "rolling_avg" in graph:
+        view["avg_data"].set_data(country_data['date'], graph["rolling_avg"])
+        avg_line.set_label(graph["smoothing"])
+        avg_line.set_visible(True)
+        ax.legend()
+    else:
+        avg_line.set_visible(False)
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+
+    ax.relim(visible_only=True)
+    ax.autoscale_view()
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+
+
+def plot_overlay_view(ax, graph):
+    """Create the multi-location view; its lines are added by update_overlay_view."""
+    ax.set_xlabel("Date", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    view = {"ax": ax, "lines": {}, "colors": {}}
+    update_overlay_view(view, graph)
+    return view
+
+
+def update_overlay_view(view, graph):
+    """Sync the overlay's lines with the prepared locations.
+
+    Lines of locations still selected only get new data and keep their
+    color, so adding or removing a location redraws nothing else.
+    """
+    ax = view["ax"]
+    overlay = graph["overlay"]
+    lines = view["lines"]
+    colors = view["colors"]
+    locations = overlay["locations"]
+
+    for location in [location for location in lines if location not in locations]:
+        lines.pop(location).remove()
+
+    palette = sns.color_palette("tab20", MAX_OVERLAY)
+    dates = overlay["dates"].to_numpy()
+    for i, location in enumerate(locations):
+        values = overlay["values"][:, i]
+        present = ~np.isnan(values)
+        if location not in lines:
+            used = set(colors[other] for other in lines)
+            colors[location] = next((color for color in palette if color not in used), palette[0])
+            line, = ax.plot([], [], linewidth=2, color=colors[location])
+            lines[location] = DecimatedLine(line)
+        lines[location].line.set_label(location)
+        lines[location].set_data(dates[present], values[present])
+
+    readable_metric = overlay["readable_metric"]
+    title = f"{readable_metric} by Country"
+    if overlay["smoothing"]:
+        title += f" ({overlay['smoothing']})"
+    format_date_axis(ax, dates)
+    ax.set_title(title, fontsize=16)
+    ax.set_ylabel(readable_metric, fontsize=12)
+    view["metric"] = graph["metric"]
+
+    # Keep the legend in selection order
+    if lines:
+        ax.legend([lines[location].line for location in locations], locations, fontsize=9, ncol=2)
+    elif ax.get_legend() is not None:
+        ax.get_legend().remove()
+
+    ax.relim(visible_only=True)
+    ax.autoscale_view()
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+
+
+@PROFILER.timed()
+def plot_top_countries(ax, metric, latest_data, smoothing=None):
+    """Plot comparison of top countries for the given metric (smoothing names the smoothed values, if any)."""
+    try:
+        if not latest_data.empty:
+            # Create bar plot
+            bars = ax.barh(latest_data['location'], latest_data[metric], color=sns.color_palette("viridis", 10))
+            labels = format_values(metric, latest_data[metric])
+
+            # Add values at the end of bars
+            for bar, label in zip(bars, labels):
+                width = bar.get_width()
+                label_x_pos = width if width > 0 else 0
+                ax.text(label_x_pos + (max(latest_data[metric]) * 0.01), 
+                        bar.get_y() + bar.get_height()/2, 
+                        label or "", 
+                        va='center')
+
+            title = f"Top 10 Countries by {metric_info(metric).label}"
+            if smoothing:
+                title += f" ({smoothing})"
+            ax.set_title(title, fontsize=16)
+            ax.set_xlabel(metric_info(metric).label, fontsize=12)
+            ax.invert_yaxis()  # To have highest value at the top
+            ax.grid(True, linestyle='--', alpha=0.7, axis='x')
+        else:
+            ax.text(0.5, 0.5, f"No data available for {metric}", 
+                    ha='center', va='center', transform=ax.transAxes, fontsize=14)
+
+    except Exception as e:
+        ax.text(0.5, 0.5, f"Error creating comparison: {str(e)}", 
+                ha='center', va='center', transform=ax.transAxes, fontsize=14)
+
+
+def plot_graph(fig, graph):
+    """Draw a prepared main graph on an empty figure.
+
+    Returns the artists of the single-country or overlay view, or None for
+    the other layouts.
+    """
+    ax = fig.add_subplot(111)
+    country = graph["country"]
+    metric = graph["metric"]
+    
+    if "overlay" in graph:
+        return plot_overlay_view(ax, graph)
+    elif graph["compare"]:
+        # Compare top countries
+        plot_top_countries(ax, metric, graph["top_data"], graph.get("smoothing"))
+    elif not graph["country_data"].empty:
+        # Plot single country data
+        return plot_country_view(ax, graph)
+    else:
+        ax.text(0.5, 0.5, f"No data available for {metric} in {country}", 
+                ha='center', va='center', transform=ax.transAxes, fontsize=14)
+    return None
+
+
+def plot_trends(fig, data):
+    """Draw the four trend panels (cases, deaths, tests, vaccinations) for one location."""
+    # Create subplots
+    ax1 = fig.add_subplot(221)  # Cases
+    ax2 = fig.add_subplot(222)  # Deaths
+    ax3 = fig.add_subplot(223)  # Tests
+    ax4 = fig.add_subplot(224)  # Vaccinations
+
+    # Plot cases
+    if 'new_cases_smoothed' in data.columns and not data['new_cases_smoothed'].isna().all():
+        plot_decimated(ax1, data['date'], data['new_cases_smoothed'], color='#3498db')
+        ax1.set_title('New Cases (7-day avg)')
+        format_date_axis(ax1, data['date'])
+        plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        ax1.grid(True, linestyle='--', alpha=0.7)
+    else:
+        ax1.text(0.5, 0.5, 'No cases data available', ha='center', va='center', transform=ax1.transAxes)
+
+    # Plot deaths
+    if 'new_deaths_smoothed' in data.columns and not data['new_deaths_smoothed'].isna().all():
+        plot_decimated(ax2, data['date'], data['new_deaths_smoothed'], color='#e74c3c')
+        ax2.set_title('New Deaths (7-day avg)')
+        format_date_axis(ax2, data['date'])
+        plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        ax2.grid(True, linestyle='--', alpha=0.7)
+    else:
+        ax2.text(0.5, 0.5, 'No deaths data available', ha='center', va='center', transform=ax2.transAxes)
+
+    # Plot testing
+    if 'positive_rate' in data.columns and not data['positive_rate'].isna().all():
+        plot_decimated(ax3, data['date'], data['positive_rate'], color='#f39c12')
+        ax3.set_title('Positive Test Rate')
+        format_date_axis(ax3, data['date'])
+        plt.setp(ax3.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        ax3.grid(True, linestyle='--', alpha=0.7)
+    else:
+        ax3.text(0.5, 0.5, 'No testing data available', ha='center', va='center', transform=ax3.transAxes)
+
+    # Plot vaccinations
+    if 'people_fully_vaccinated' in data.columns and not data['people_fully_vaccinated'].isna().all():
+        # Share of the population (a derived metric) where the population is known
+        share = data.get('people_fully_vaccinated_share')
+        if share is not None and not share.isna().all():
+            plot_decimated(ax4, data['date'], share, color='#2ecc71')
+            ax4.set_title(metric_info('people_fully_vaccinated_share').label)
+            ax4.set_ylim([0, 100])
+        else:
+            plot_decimated(ax4, data['date'], data['people_fully_vaccinated'], color='#2ecc71')
+            ax4.set_title('Fully Vaccinated (Count)')
+
+        format_date_axis(ax4, data['date'])
+        plt.setp(ax4.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        ax4.grid(True, linestyle='--', alpha=0.7)
+    else:
+        ax4.text(0.5, 0.5, 'No vaccination data available', ha='center', va='center', transform=ax4.transAxes)
+
+
+def plot_vaccination(fig, vacc):
+    """Draw the vaccination ranking and timeline panels."""
+    # Add subplots
+    ax1 = fig.add_subplot(211)  # Top countries
+    ax2 = fig.add_subplot(212)  # Timeline
+
+    metric = vacc["metric"]
+    metric_title = vacc["metric_title"]
+    top_countries = vacc["top_countries"]
+
+    if not top_countries.empty:
+        # Create bar chart
+        bars = ax1.barh(top_countries['location'], top_countries[metric], color=sns.color_palette("viridis", 15))
+        ax1.set_title(f"Top Countries by Vaccination Rate ({metric_title})", fontsize=14)
+        ax1.set_xlabel("Percentage of Population (%)", fontsize=12)
+        ax1.invert_yaxis()  # To have highest value at the top
+        ax1.grid(True, linestyle='--', alpha=0.7, axis='x')
+
+        # Add percentages to bars
+        for bar, label in zip(bars, format_values(metric, top_countries[metric])):
+            width = bar.get_width()
+            ax1.text(width + 1, bar.get_y() + bar.get_height()/2, label or "", 
+                    va='center', fontsize=10)
+    else:
+        ax1.text(0.5, 0.5, "No vaccination data available", ha='center', va='center', 
+                 transform=ax1.transAxes, fontsize=14)
+
+    # Plot timeline
+    timeline = vacc["timeline"]
+    if timeline["locations"]:
+        # Every location in one call, one line per matrix column
+        ax2.set_prop_cycle(color=sns.color_palette("viridis", len(timeline["locations"])))
+        lines = ax2.plot(timeline["dates"], timeline["values"], linewidth=2)
+        for line, location, values in zip(lines, timeline["locations"], timeline["values"].T):
+            line.set_label(location)
+            DecimatedLine(line).set_data(timeline["dates"], values)
+
+        ax2.set_title(f"Vaccination Progress Over Time ({metric_title})", fontsize=14)
+        ax2.set_xlabel("Date", fontsize=12)
+        ax2.set_ylabel("Percentage of Population (%)", fontsize=12)
+        ax2.grid(True, linestyle='--', alpha=0.7)
+        ax2.legend(loc='upper left')
+
+        # Format x-axis
+        format_date_axis(ax2, timeline["dates"], interval=2)
+        plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
+    else:
+        ax2.text(0.5, 0.5, "No timeline data available", ha='center', va='center', 
+                 transform=ax2.transAxes, fontsize=14)
+
 
 class CovidDataTracker:
-    def __init__(self, root):
+    def __init__(self, root, csv_path=DATA_FILE, low_memory=False, compact=False):
         self.root = root
+        self.csv_path = csv_path
+        self.low_memory = low_memory
+        self.compact = compact
         self.root.title("COVID-19 Global Data Tracker")
         self.root.geometry("1200x700")
         self.root.configure(bg="#f0f0f0")
         
         # Load data
         try:
-            self.df = pd.read_csv("owid_covid_data.csv")
-            # Convert date column to datetime
-            self.df['date'] = pd.to_datetime(self.df['date'])
-            # Get list of countries (excluding continents and income groups)
-            self.countries = sorted(self.df[~self.df['iso_code'].str.contains('OWID_', na=False)]['location'].unique())
+            self.load_data(csv_path)
             self.setup_ui()
         except FileNotFoundError:
             tk.Label(
@@ -42,6 +2561,13 @@ class CovidDataTracker:
                 font=("Arial", 14)
             ).pack(pady=50)
 
+    def load_data(self, csv_path):
+        """Load the dataset and (re)build everything derived from it."""
+        # A new dataset brings its own index, snapshot and (empty) series cache
+        self.data = CovidDataset.load(csv_path, low_memory=self.low_memory, lazy=True, compact=self.compact)
+        self.snapshot = self.data.snapshot
+        self.countries = self.data.countries
+
     def setup_ui(self):
         # Create frame for controls
         control_frame = tk.Frame(self.root, bg="#f0f0f0")
@@ -74,16 +2600,7 @@ class CovidDataTracker:
         metric_label = tk.Label(control_frame, text="Metric:", bg="#f0f0f0", font=("Arial", 12))
         metric_label.grid(row=1, column=2, padx=5, pady=5, sticky="w")
         
-        self.metrics = [
-            "total_cases", "new_cases", 
-            "total_deaths", "new_deaths",
-            "total_cases_per_million", "new_cases_per_million",
-            "total_deaths_per_million", "new_deaths_per_million",
-            "icu_patients", "hosp_patients", 
-            "total_vaccinations", "people_vaccinated",
-            "people_fully_vaccinated", "total_boosters",
-            "reproduction_rate"
-        ]
+        self.metrics = list(METRICS) + list(DERIVED_METRICS)
         
         self.metric_var = tk.StringVar(value="total_cases")
         self.metric_dropdown = ttk.Combobox(
@@ -106,11 +2623,104 @@ class CovidDataTracker:
         )
         compare_check.grid(row=2, column=0, padx=5, pady=5, sticky="w")
         
+        # Smoothing selection
+        smoothing_label = tk.Label(control_frame, text="Smoothing:", bg="#f0f0f0", font=("Arial", 12))
+        smoothing_label.grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        
+        self.smoothing_window_var = tk.StringVar(value="Auto")
+        self.smoothing_window_dropdown = ttk.Combobox(
+            control_frame, 
+            textvariable=self.smoothing_window_var,
+            values=SMOOTHING_WINDOWS,
+            width=10,
+            font=("Arial", 12),
+            state="readonly"
+        )
+        self.smoothing_window_dropdown.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        
+        self.smoothing_method_var = tk.StringVar(value="Mean")
+        self.smoothing_method_dropdown = ttk.Combobox(
+            control_frame, 
+            textvariable=self.smoothing_method_var,
+            values=list(SMOOTHING_METHODS),
+            width=15,
+            font=("Arial", 12),
+            state="readonly"
+        )
+        self.smoothing_method_dropdown.grid(row=3, column=2, padx=5, pady=5, sticky="w")
+        
+        # Date range selection
+        range_label = tk.Label(control_frame, text="Date Range:", bg="#f0f0f0", font=("Arial", 12))
+        range_label.grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        
+        self.range_var = tk.StringVar(value="All Dates")
+        self.range_dropdown = ttk.Combobox(
+            control_frame, 
+            textvariable=self.range_var,
+            values=list(DATE_RANGES),
+            width=15,
+            font=("Arial", 12),
+            state="readonly"
+        )
+        self.range_dropdown.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+        
+        # Custom range (YYYY-MM-DD; either end may be left empty)
+        custom_frame = tk.Frame(control_frame, bg="#f0f0f0")
+        custom_frame.grid(row=4, column=2, columnspan=2, padx=5, pady=5, sticky="w")
+        self.range_start_var = tk.StringVar()
+        self.range_end_var = tk.StringVar()
+        tk.Label(custom_frame, text="From:", bg="#f0f0f0", font=("Arial", 12)).pack(side=tk.LEFT)
+        start_entry = tk.Entry(custom_frame, textvariable=self.range_start_var, width=12, font=("Arial", 12))
+        start_entry.pack(side=tk.LEFT, padx=5)
+        tk.Label(custom_frame, text="To:", bg="#f0f0f0", font=("Arial", 12)).pack(side=tk.LEFT)
+        end_entry = tk.Entry(custom_frame, textvariable=self.range_end_var, width=12, font=("Arial", 12))
+        end_entry.pack(side=tk.LEFT, padx=5)
+        
+        # Countries overlaid on one graph
+        overlay_label = tk.Label(control_frame, text="Overlay:", bg="#f0f0f0", font=("Arial", 12))
+        overlay_label.grid(row=5, column=0, padx=5, pady=5, sticky="nw")
+        
+        overlay_list_frame = tk.Frame(control_frame, bg="#f0f0f0")
+        overlay_list_frame.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+        self.overlay_list = tk.Listbox(
+            overlay_list_frame,
+            selectmode=tk.MULTIPLE,
+            exportselection=False,
+            height=4,
+            width=30,
+            font=("Arial", 12)
+        )
+        overlay_scrollbar = tk.Scrollbar(overlay_list_frame, command=self.overlay_list.yview)
+        self.overlay_list.configure(yscrollcommand=overlay_scrollbar.set)
+        self.overlay_list.pack(side=tk.LEFT)
+        overlay_scrollbar.pack(side=tk.LEFT, fill="y")
+        self.fill_overlay_list()
+        
+        overlay_options = tk.Frame(control_frame, bg="#f0f0f0")
+        overlay_options.grid(row=5, column=2, columnspan=2, padx=5, pady=5, sticky="nw")
+        self.overlay_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            overlay_options, 
+            text="Overlay Selected Countries", 
+            variable=self.overlay_var,
+            bg="#f0f0f0",
+            font=("Arial", 12)
+        ).pack(anchor="w")
+        self.per_capita_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            overlay_options, 
+            text="Per Million People", 
+            variable=self.per_capita_var,
+            bg="#f0f0f0",
+            font=("Arial", 12)
+        ).pack(anchor="w")
+        tk.Button(overlay_options, text="Clear Selection", command=self.clear_overlay, font=("Arial", 12)).pack(anchor="w", pady=2)
+        
         # Add buttons for different analyses
         button_frame = tk.Frame(control_frame, bg="#f0f0f0")
         button_frame.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="w")
         
-        update_button = tk.Button(button_frame, text="Update Graph", command=self.update_graph, font=("Arial", 12))
+        update_button = tk.Button(button_frame, text="Update Graph", command=lambda: self.redraw.request(force=True), font=("Arial", 12))
         update_button.pack(side=tk.LEFT, padx=5)
         
         global_stats_button = tk.Button(button_frame, text="Global Stats", command=self.show_global_stats, font=("Arial", 12))
@@ -122,22 +2732,38 @@ class CovidDataTracker:
         vaccination_button = tk.Button(button_frame, text="Vaccination Progress", command=self.show_vaccination_data, font=("Arial", 12))
         vaccination_button.pack(side=tk.LEFT, padx=5)
         
+        refresh_button = tk.Button(button_frame, text="Refresh Data", command=self.refresh_data, font=("Arial", 12))
+        refresh_button.pack(side=tk.LEFT, padx=5)
+        
         # Create a frame for the plot
         self.plot_frame = tk.Frame(self.root, bg="white")
         self.plot_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
-        # Bind events
-        self.country_dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_graph())
-        self.metric_dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_graph())
-        self.compare_var.trace("w", lambda *args: self.update_graph())
+        # Bind events (bursts of changes are merged into one redraw)
+        self.redraw = RedrawScheduler(self.root, self.graph_key, self.update_graph)
+        self.country_dropdown.bind("<<ComboboxSelected>>", lambda e: self.redraw.request())
+        self.metric_dropdown.bind("<<ComboboxSelected>>", lambda e: self.redraw.request())
+        self.compare_var.trace("w", lambda *args: self.redraw.request())
+        self.smoothing_window_dropdown.bind("<<ComboboxSelected>>", lambda e: self.redraw.request())
+        self.smoothing_method_dropdown.bind("<<ComboboxSelected>>", lambda e: self.redraw.request())
+        self.range_dropdown.bind("<<ComboboxSelected>>", lambda e: self.redraw.request())
+        start_entry.bind("<Return>", lambda e: self.apply_custom_range())
+        end_entry.bind("<Return>", lambda e: self.apply_custom_range())
+        self.overlay_list.bind("<<ListboxSelect>>", lambda e: self.redraw.request())
+        self.overlay_var.trace("w", lambda *args: self.redraw.request())
+        self.per_capita_var.trace("w", lambda *args: self.redraw.request())
         
         # Initialize with default graph
         self.fig = plt.Figure(figsize=(10, 6), dpi=100)
+        self.single_view = None  # persistent artists of the single-country view
+        self.overlay_view = None  # persistent artists of the overlay view
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+        # Every draw, including the deferred draw_idle ones, is timed
+        self.canvas.draw = PROFILER.timed("draw")(self.canvas.draw)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
         
         # Status bar
-        self.status_var = tk.StringVar(value="Ready")
+        self.status_var = tk.StringVar(value=self.data.describe_load())
         status_bar = tk.Label(
             self.root, 
             textvariable=self.status_var, 
@@ -148,122 +2774,270 @@ class CovidDataTracker:
         )
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Load initial graph
-        self.update_graph()
-
-    def get_country_data(self, country, metric):
-        """Get data for a specific country and metric."""
-        if country == "World":
-            data = self.df[self.df['iso_code'] == 'OWID_WRL'].copy()
-        else:
-            data = self.df[self.df['location'] == country].copy()
+        # Profiler overlay above the status bar (F12 shows/hides it, F11 saves
+        # a JSON trace, F10 starts/stops a cProfile session)
+        self.profile_var = tk.StringVar()
+        self.profile_bar = tk.Label(
+            self.root, 
+            textvariable=self.profile_var, 
+            bd=1, 
+            relief=tk.SUNKEN, 
+            anchor=tk.W,
+            fg="#2c3e50",
+            font=("Courier", 9)
+        )
+        self.profile_visible = False
+        self.profile_after = None
+        self.root.bind("<F12>", lambda e: self.toggle_profile_overlay())
+        self.root.bind("<F11>", lambda e: self.save_profile_trace())
+        self.root.bind("<F10>", lambda e: self.toggle_cprofile())
         
-        # Filter out rows where the metric is NaN
-        data = data[['date', metric]].dropna(subset=[metric])
+        # Data queries run in the background so the window stays responsive
+        self.worker = BackgroundWorker(self.root, on_progress=self.show_progress)
         
-        # Replace metric name for better display
-        readable_metric = metric.replace('_', ' ').title()
+        # Country stats window, reused while it is open
+        self.stats_window = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        return data, readable_metric
+        # Load initial graph
+        self.redraw.request()
+
+    def on_close(self):
+        """Stop background work and close the application."""
+        self.worker.shutdown()
+        self.root.destroy()
+
+    def toggle_profile_overlay(self):
+        """Show or hide the live stage timings above the status bar."""
+        self.profile_visible = not self.profile_visible
+        if self.profile_visible:
+            self.profile_bar.pack(side=tk.BOTTOM, fill=tk.X)
+            self.update_profile_overlay()
+        else:
+            self.profile_bar.pack_forget()
+            # Otherwise showing it again within one interval starts a second loop
+            if self.profile_after is not None:
+                self.root.after_cancel(self.profile_after)
+                self.profile_after = None
+
+    def update_profile_overlay(self):
+        """Refresh the overlay while it is visible."""
+        if not self.profile_visible:
+            return
+        prefix = "[cProfile running] " if PROFILER.profiling else ""
+        self.profile_var.set(prefix + PROFILER.summary())
+        self.profile_after = self.root.after(PROFILE_OVERLAY_MS, self.update_profile_overlay)
+
+    def save_profile_trace(self):
+        """Write the recorded stage timings as a JSON trace."""
+        path = filedialog.asksaveasfilename(
+            title="Save profiler trace",
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json")]
+        )
+        if path:
+            count = PROFILER.dump_trace(path)
+            self.status_var.set(f"Saved {count} stage timings to {path}")
+
+    def toggle_cprofile(self):
+        """Start a cProfile session, or stop the running one and save its stats."""
+        if not PROFILER.profiling:
+            PROFILER.start_profile()
+            self.status_var.set("cProfile started; press F10 again to stop and save")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Save cProfile stats",
+            defaultextension=".prof",
+            filetypes=[("Profile stats", "*.prof")]
+        )
+        PROFILER.stop_profile(path or None)
+        self.status_var.set(f"cProfile stats saved to {path}" if path else "cProfile stopped")
+
+    def show_progress(self, pending):
+        """Show the number of background queries in the status bar."""
+        if pending:
+            self.status_var.set(f"Loading data... ({pending} pending)")
+
+    def show_worker_error(self, error):
+        """Report an exception raised by a background query."""
+        self.status_var.set(f"Error: {str(error)}")
+        messagebox.showerror("Error", f"An error occurred: {str(error)}")
+
+    def smoothing(self):
+        """Selected smoothing as (method, window) for CovidDataset.prepare_graph."""
+        window = self.smoothing_window_var.get()
+        if window == "Auto":
+            window = "auto"
+        elif window == "Off":
+            window = None
+        else:
+            window = int(window)
+        return SMOOTHING_METHODS[self.smoothing_method_var.get()], window
+
+    def date_range(self):
+        """Selected date range as (start, end), or None for the full history."""
+        choice = self.range_var.get()
+        if choice != "Custom":
+            return self.data.date_range(days=DATE_RANGES.get(choice))
+        try:
+            return self.data.date_range(
+                start=self.range_start_var.get().strip() or None,
+                end=self.range_end_var.get().strip() or None
+            )
+        except ValueError:
+            self.status_var.set("Invalid date range; use YYYY-MM-DD. Showing all dates.")
+            return None
+
+    def apply_custom_range(self):
+        """Switch to the custom range typed into the From/To fields."""
+        self.range_var.set("Custom")
+        self.redraw.request()
+
+    def fill_overlay_list(self):
+        """List the locations that can be overlaid, keeping the current selection."""
+        selected = set(self.overlay_list.get(i) for i in self.overlay_list.curselection())
+        self.overlay_list.delete(0, tk.END)
+        for i, location in enumerate(["World"] + self.countries):
+            self.overlay_list.insert(tk.END, location)
+            if location in selected:
+                self.overlay_list.selection_set(i)
+
+    def clear_overlay(self):
+        """Deselect every overlaid location."""
+        self.overlay_list.selection_clear(0, tk.END)
+        self.redraw.request()
+
+    def overlay_locations(self):
+        """Locations to overlay (at most MAX_OVERLAY, in list order), or None when the overlay is off."""
+        if not self.overlay_var.get():
+            return None
+        selected = [self.overlay_list.get(i) for i in self.overlay_list.curselection()]
+        return tuple(selected[:MAX_OVERLAY]) or None
+
+    def graph_key(self):
+        """Describe what the main graph shows for the current selections."""
+        return (self.country_var.get(), self.metric_var.get(), self.compare_var.get(), self.smoothing(), self.date_range(),
+                self.overlay_locations(), self.per_capita_var.get())
+
+    def show_graph_error(self, error):
+        """Report a failed main graph update so the next request redraws it."""
+        self.redraw.invalidate()
+        self.show_worker_error(error)
 
     def update_graph(self):
         """Update the graph based on current selections."""
+        country = self.country_var.get()
+        metric = self.metric_var.get()
+        compare = self.compare_var.get()
+        method, window = self.smoothing()
+        date_range = self.date_range()
+        overlay = self.overlay_locations()
+        per_capita = self.per_capita_var.get()
+        requested = time.perf_counter()
+        
+        self.worker.submit(
+            "main_graph",
+            lambda: self.data.prepare_graph(country, metric, compare, method, window, date_range, overlay, per_capita),
+            lambda graph: self.render_graph(graph, requested),
+            self.show_graph_error
+        )
+
+    def render_graph(self, graph, requested=None):
+        """Draw a prepared main graph on the Tk thread.
+
+        ``requested`` (a time.perf_counter() value) records the time since
+        the update was requested as the "update_graph" stage.
+        """
         try:
-            self.status_var.set("Loading data...")
-            self.root.update_idletasks()
+            country = graph["country"]
+            metric = graph["metric"]
             
-            self.fig.clear()
-            ax = self.fig.add_subplot(111)
-            
-            country = self.country_var.get()
-            metric = self.metric_var.get()
+            if "overlay" in graph:
+                view, update = self.overlay_view, update_overlay_view
+            elif not graph["compare"] and not graph["country_data"].empty:
+                view, update = self.single_view, update_country_view
+            else:
+                view = None
             
-            if self.compare_var.get():
-                # Compare top countries
-                self.plot_top_countries(ax, metric)
+            if view is not None:
+                # Same layout as on screen: only swap the line data
+                metric_changed = view["metric"] != metric
+                with PROFILER.stage("plot"):
+                    update(view, graph)
+                if metric_changed:
+                    # Tick labels of a different metric can change the margins
+                    with PROFILER.stage("tight_layout"):
+                        self.fig.tight_layout()
+                self.canvas.draw_idle()
             else:
-                # Plot single country data
-                country_data, readable_metric = self.get_country_data(country, metric)
-                
-                if not country_data.empty:
-                    ax.plot(country_data['date'], country_data[metric], linewidth=2, marker='', color='#3498db')
-                    ax.set_title(f"{readable_metric} in {country}", fontsize=16)
-                    ax.set_xlabel("Date", fontsize=12)
-                    ax.set_ylabel(readable_metric, fontsize=12)
-                    
-                    # Format the date axis
-                    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-                    ax.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-                    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-                    
-                    # Add grid
-                    ax.grid(True, linestyle='--', alpha=0.7)
-                    
-                    # Add a slight smoothing for visual appeal
-                    if len(country_data) > 30:
-                        window_size = min(7, len(country_data) // 10)
-                        rolling_avg = country_data[metric].rolling(window=window_size).mean()
-                        ax.plot(country_data['date'], rolling_avg, linewidth=3, color='#e74c3c', 
-                                label=f"{window_size}-day Moving Average")
-                        ax.legend()
-                else:
-                    ax.text(0.5, 0.5, f"No data available for {metric} in {country}", 
-                            ha='center', va='center', transform=ax.transAxes, fontsize=14)
+                self.fig.clear()
+                with PROFILER.stage("plot"):
+                    view = plot_graph(self.fig, graph)
+                self.single_view = view if "overlay" not in graph else None
+                self.overlay_view = view if "overlay" in graph else None
+                with PROFILER.stage("tight_layout"):
+                    self.fig.tight_layout()
+                self.canvas.draw()
+            if requested is not None:
+                # A deferred draw_idle is timed separately, as "draw"
+                PROFILER.record("update_graph", requested, time.perf_counter() - requested)
             
-            self.fig.tight_layout()
-            self.canvas.draw()
-            self.status_var.set(f"Displaying data for: {country} - {metric.replace('_', ' ').title()}")
+            if "overlay" in graph:
+                overlay = graph["overlay"]
+                selected = len(self.overlay_list.curselection())
+                shown = f"the first {MAX_OVERLAY} of {selected}" if selected > MAX_OVERLAY else str(len(overlay['locations']))
+                self.status_var.set(f"Comparing {shown} countries - {overlay['readable_metric']}")
+            else:
+                self.status_var.set(f"Displaying data for: {country} - {metric_info(metric).label}")
             
         except Exception as e:
-            self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            self.single_view = None
+            self.overlay_view = None
+            self.show_graph_error(e)
 
-    def plot_top_countries(self, ax, metric):
-        """Plot comparison of top countries for the given metric."""
-        try:
-            # Get the latest date with good data coverage
-            latest_dates = self.df.groupby('location')['date'].max().reset_index()
-            common_date = latest_dates['date'].value_counts().idxmax()
-            
-            # Get data for the latest date
-            latest_data = self.df[self.df['date'] == common_date].copy()
-            
-            # Filter out continents and World
-            latest_data = latest_data[~latest_data['iso_code'].str.contains('OWID_', na=False)]
-            
-            # Sort by the metric and get top 10 countries
-            latest_data = latest_data.sort_values(by=metric, ascending=False).head(10)
-            
-            if not latest_data.empty:
-                # Create bar plot
-                bars = ax.barh(latest_data['location'], latest_data[metric], color=sns.color_palette("viridis", 10))
-                
-                # Add values at the end of bars
-                for bar in bars:
-                    width = bar.get_width()
-                    label_x_pos = width if width > 0 else 0
-                    ax.text(label_x_pos + (max(latest_data[metric]) * 0.01), 
-                            bar.get_y() + bar.get_height()/2, 
-                            f'{width:,.0f}', 
-                            va='center')
-                
-                ax.set_title(f"Top 10 Countries by {metric.replace('_', ' ').title()}", fontsize=16)
-                ax.set_xlabel(metric.replace('_', ' ').title(), fontsize=12)
-                ax.invert_yaxis()  # To have highest value at the top
-                ax.grid(True, linestyle='--', alpha=0.7, axis='x')
-            else:
-                ax.text(0.5, 0.5, f"No data available for {metric}", 
-                        ha='center', va='center', transform=ax.transAxes, fontsize=14)
-                
-        except Exception as e:
-            ax.text(0.5, 0.5, f"Error creating comparison: {str(e)}", 
-                    ha='center', va='center', transform=ax.transAxes, fontsize=14)
+    def refresh_data(self):
+        """Merge a newer CSV or a delta file into the loaded data without restarting."""
+        path = filedialog.askopenfilename(
+            title="Refresh from CSV",
+            initialdir=os.path.dirname(os.path.abspath(self.csv_path)),
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        self.worker.submit(
+            "refresh",
+            lambda: self.data.prepare_refresh(path),
+            self.apply_refresh,
+            self.show_worker_error
+        )
+
+    def apply_refresh(self, refresh):
+        """Apply refreshed data once the background queries have finished, then redraw."""
+        # Queries still running on the old data must not see half of the update
+        self.worker.when_idle(lambda: self.finish_refresh(refresh))
+
+    def finish_refresh(self, refresh):
+        self.data.apply_refresh(refresh)
+        self.snapshot = self.data.snapshot
+        self.countries = self.data.countries
+        self.country_dropdown.configure(values=["World"] + self.countries)
+        self.fill_overlay_list()
+        
+        if refresh["patch"] is not None:
+            self.redraw.request(force=True)
+        messagebox.showinfo(
+            "Refresh",
+            f"Added {refresh['added']:,} rows and revised {refresh['revised']:,} rows "
+            f"for {len(refresh['locations'])} locations in {refresh['seconds']:.1f}s"
+        )
 
     def show_global_stats(self):
         """Show global statistics window."""
         try:
             # Get the latest global data
-            world_data = self.df[self.df['iso_code'] == 'OWID_WRL'].sort_values('date').tail(1)
+            self.data.require([column for _, column in GLOBAL_STATS_METRICS])
+            world_data = self.snapshot.latest_row("World")
             
             if world_data.empty:
                 messagebox.showinfo("Info", "No global data available")
@@ -296,31 +3070,10 @@ class CovidDataTracker:
             stats_frame = tk.Frame(stats_window, bg="#f0f0f0")
             stats_frame.pack(fill="both", expand=True, padx=20, pady=10)
             
-            # Define key metrics to display
-            key_metrics = [
-                ("Total Cases", "total_cases"),
-                ("Total Deaths", "total_deaths"),
-                ("Cases per Million", "total_cases_per_million"),
-                ("Deaths per Million", "total_deaths_per_million"),
-                ("Total Vaccinations", "total_vaccinations"),
-                ("People Fully Vaccinated", "people_fully_vaccinated"),
-                ("Current Reproduction Rate", "reproduction_rate")
-            ]
-            
             # Display metrics
-            for i, (label, column) in enumerate(key_metrics):
-                try:
-                    value = world_data[column].iloc[0]
-                    if pd.isna(value):
-                        formatted_value = "Data not available"
-                    elif column.endswith("_rate"):
-                        formatted_value = f"{value:.2f}"
-                    elif "total" in column or "people" in column:
-                        formatted_value = f"{value:,.0f}"
-                    else:
-                        formatted_value = f"{value:,.2f}"
-                except:
-                    formatted_value = "Data not available"
+            formatted = format_frame(world_data, [column for _, column in GLOBAL_STATS_METRICS]).iloc[0]
+            for i, (label, column) in enumerate(GLOBAL_STATS_METRICS):
+                formatted_value = formatted.get(column) or "Data not available"
                 
                 frame = tk.Frame(stats_frame, bg="#f0f0f0")
                 frame.grid(row=i//2, column=i%2, padx=10, pady=5, sticky="nsew")
@@ -347,223 +3100,157 @@ class CovidDataTracker:
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
+    @PROFILER.timed()
     def show_country_stats(self):
-        """Show detailed statistics for selected country."""
+        """Show detailed statistics for selected country (reusing the window if it is open)."""
         try:
             country = self.country_var.get()
             
-            if country == "World":
-                country_data = self.df[self.df['iso_code'] == 'OWID_WRL'].copy()
-            else:
-                country_data = self.df[self.df['location'] == country].copy()
+            self.data.require(country_stats_columns())
+            country_data = self.data.location_rows(country)
                 
             if country_data.empty:
                 messagebox.showinfo("Info", f"No data available for {country}")
                 return
                 
             # Get latest data
-            latest_data = country_data.sort_values('date').tail(1)
-            
-            # Create a new window
-            stats_window = tk.Toplevel(self.root)
-            stats_window.title(f"COVID-19 Statistics for {country}")
-            stats_window.geometry("700x600")
-            stats_window.configure(bg="#f0f0f0")
+            latest_data = self.snapshot.latest_row(country)
             
-            # Title
-            tk.Label(
-                stats_window, 
-                text=f"COVID-19 Statistics for {country}",
-                font=("Arial", 16, "bold"),
-                bg="#f0f0f0"
-            ).pack(pady=10)
+            if self.stats_window is None or not self.stats_window.winfo_exists():
+                self.create_country_stats_window()
             
-            # Date info
+            self.stats_window.title(f"COVID-19 Statistics for {country}")
+            self.stats_title_var.set(f"COVID-19 Statistics for {country}")
             latest_date = latest_data['date'].iloc[0].strftime("%B %d, %Y")
-            tk.Label(
-                stats_window, 
-                text=f"Latest data as of: {latest_date}",
-                font=("Arial", 12),
-                bg="#f0f0f0"
-            ).pack(pady=5)
-            
-            # Create notebook (tabbed interface)
-            notebook = ttk.Notebook(stats_window)
-            notebook.pack(fill="both", expand=True, padx=10, pady=10)
-            
-            # Current stats tab
-            current_tab = tk.Frame(notebook, bg="#f0f0f0")
-            notebook.add(current_tab, text="Current Stats")
-            
-            # Trends tab
-            trends_tab = tk.Frame(notebook, bg="#f0f0f0")
-            notebook.add(trends_tab, text="Trends")
+            self.stats_date_var.set(f"Latest data as of: {latest_date}")
             
             # Population tab (if data available)
-            if not pd.isna(latest_data['population'].iloc[0]):
-                population_tab = tk.Frame(notebook, bg="#f0f0f0")
-                notebook.add(population_tab, text="Population Data")
-                
-                # Add population info
-                self.add_population_info(population_tab, latest_data)
+            tabs = self.stats_tabs
+            has_population = not pd.isna(latest_data['population'].iloc[0])
+            if not has_population and self.stats_notebook.select() == str(tabs["population"]):
+                self.stats_notebook.select(tabs["current"])
+            self.stats_notebook.tab(tabs["population"], state="normal" if has_population else "hidden")
             
-            # Fill current stats tab
-            self.fill_current_stats(current_tab, latest_data)
+            # Each tab is filled when it is first shown for this country
+            trends_data = country_data.iloc[date_slice(country_data['date'].to_numpy(), self.date_range())]
+            self.stats_pending = {
+                "current": lambda: self.fill_current_stats(tabs["current"], latest_data),
+                "trends": lambda: self.fill_trends_tab(tabs["trends"], trends_data),
+                "population": lambda: self.add_population_info(tabs["population"], latest_data),
+            }
+            self.render_stats_tab()
             
-            # Fill trends tab
-            self.fill_trends_tab(trends_tab, country_data)
+            self.stats_window.deiconify()
+            self.stats_window.lift()
             
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
+    def create_country_stats_window(self):
+        """Create the country stats window and its (empty) tabs."""
+        stats_window = tk.Toplevel(self.root)
+        stats_window.geometry("700x600")
+        stats_window.configure(bg="#f0f0f0")
+        stats_window.protocol("WM_DELETE_WINDOW", self.close_country_stats)
+        
+        # Title
+        self.stats_title_var = tk.StringVar()
+        tk.Label(
+            stats_window, 
+            textvariable=self.stats_title_var,
+            font=("Arial", 16, "bold"),
+            bg="#f0f0f0"
+        ).pack(pady=10)
+        
+        # Date info
+        self.stats_date_var = tk.StringVar()
+        tk.Label(
+            stats_window, 
+            textvariable=self.stats_date_var,
+            font=("Arial", 12),
+            bg="#f0f0f0"
+        ).pack(pady=5)
+        
+        # Create notebook (tabbed interface)
+        notebook = ttk.Notebook(stats_window)
+        notebook.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        self.stats_tabs = {}
+        for name, text in [("current", "Current Stats"), ("trends", "Trends"), ("population", "Population Data")]:
+            tab = tk.Frame(notebook, bg="#f0f0f0")
+            notebook.add(tab, text=text)
+            self.stats_tabs[name] = tab
+        notebook.bind("<<NotebookTabChanged>>", lambda e: self.render_stats_tab())
+        
+        self.stats_window = stats_window
+        self.stats_notebook = notebook
+        self.stats_pending = {}
+        self.trends_fig = None
+        self.trends_canvas = None
+
+    def render_stats_tab(self):
+        """Fill the selected country stats tab if it is not up to date."""
+        selected = self.stats_notebook.select()
+        for name, tab in self.stats_tabs.items():
+            if str(tab) == selected and name in self.stats_pending:
+                # The trends tab redraws its figure in place; the others are rebuilt
+                if name != "trends":
+                    for child in tab.winfo_children():
+                        child.destroy()
+                self.stats_pending.pop(name)()
+
+    def close_country_stats(self):
+        """Close the country stats window and release its figure."""
+        if self.trends_fig is not None:
+            self.trends_fig.clear()
+        self.trends_fig = None
+        self.trends_canvas = None
+        self.stats_pending = {}
+        self.stats_window.destroy()
+        self.stats_window = None
+
     def fill_current_stats(self, tab, data):
         """Fill the current stats tab with data."""
-        # Create scrollable frame
-        canvas = tk.Canvas(tab, bg="#f0f0f0")
-        scrollbar = ttk.Scrollbar(tab, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg="#f0f0f0")
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        # A Treeview only draws the rows in view, so opening time barely
+        # depends on how many metrics there are
+        tree = ttk.Treeview(tab, columns=("value",), show="tree headings")
+        tree.heading("#0", text="Metric", anchor="w")
+        tree.heading("value", text="Value", anchor="e")
+        tree.column("#0", width=420)
+        tree.column("value", width=200, anchor="e")
+        tree.tag_configure("section", font=("Arial", 12, "bold"))
+        tree.tag_configure("metric", font=("Arial", 12), foreground="#2980b9")
+        tree.tag_configure("empty", font=("Arial", 12, "italic"), foreground="gray")
         
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar = ttk.Scrollbar(tab, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
         
-        canvas.pack(side="left", fill="both", expand=True)
+        tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Define sections and metrics
-        sections = [
-            ("Cases", ["total_cases", "new_cases", "total_cases_per_million", "new_cases_per_million"]),
-            ("Deaths", ["total_deaths", "new_deaths", "total_deaths_per_million", "new_deaths_per_million"]),
-            ("Hospitalizations", ["icu_patients", "hosp_patients", "icu_patients_per_million", "hosp_patients_per_million"]),
-            ("Testing", ["total_tests", "new_tests", "positive_rate", "tests_per_case"]),
-            ("Vaccinations", ["total_vaccinations", "people_vaccinated", "people_fully_vaccinated", "total_boosters"])
-        ]
-        
         # Add metrics by section
-        row = 0
-        for section_name, metrics in sections:
-            # Section header
-            tk.Label(
-                scrollable_frame,
-                text=section_name,
-                font=("Arial", 14, "bold"),
-                bg="#f0f0f0"
-            ).grid(row=row, column=0, columnspan=2, sticky="w", padx=10, pady=(15, 5))
-            row += 1
-            
-            # Metrics
-            has_data = False
-            for metric in metrics:
-                if metric in data.columns:
-                    value = data[metric].iloc[0]
-                    if not pd.isna(value):
-                        has_data = True
-                        if "per_" in metric or "_rate" in metric or "_per_" in metric:
-                            formatted_value = f"{value:.2f}"
-                        else:
-                            formatted_value = f"{value:,.0f}"
-                            
-                        # Label
-                        tk.Label(
-                            scrollable_frame,
-                            text=metric.replace('_', ' ').title() + ":",
-                            font=("Arial", 12),
-                            bg="#f0f0f0"
-                        ).grid(row=row, column=0, sticky="w", padx=20, pady=2)
-                        
-                        # Value
-                        tk.Label(
-                            scrollable_frame,
-                            text=formatted_value,
-                            font=("Arial", 12),
-                            fg="#2980b9",
-                            bg="#f0f0f0"
-                        ).grid(row=row, column=1, sticky="e", padx=20, pady=2)
-                        
-                        row += 1
+        for section_name, rows in current_stats_rows(data):
+            section = tree.insert("", "end", text=section_name, open=True, tags=("section",))
+            for label, formatted_value in rows:
+                tree.insert(section, "end", text=label + ":", values=(formatted_value,), tags=("metric",))
             
             # If no data available for this section
-            if not has_data:
-                tk.Label(
-                    scrollable_frame,
-                    text="No data available",
-                    font=("Arial", 12, "italic"),
-                    fg="gray",
-                    bg="#f0f0f0"
-                ).grid(row=row, column=0, columnspan=2, sticky="w", padx=20, pady=2)
-                row += 1
+            if not rows:
+                tree.insert(section, "end", text="No data available", tags=("empty",))
 
     def fill_trends_tab(self, tab, data):
-        """Fill the trends tab with graphs."""
-        # Create figure and canvas
-        fig = plt.Figure(figsize=(10, 8), dpi=100)
-        canvas = FigureCanvasTkAgg(fig, master=tab)
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-        
-        # Create subplots
-        ax1 = fig.add_subplot(221)  # Cases
-        ax2 = fig.add_subplot(222)  # Deaths
-        ax3 = fig.add_subplot(223)  # Tests
-        ax4 = fig.add_subplot(224)  # Vaccinations
-        
-        # Plot cases
-        if 'new_cases_smoothed' in data.columns and not data['new_cases_smoothed'].isna().all():
-            ax1.plot(data['date'], data['new_cases_smoothed'], color='#3498db')
-            ax1.set_title('New Cases (7-day avg)')
-            ax1.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-            plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45, ha='right')
-            ax1.grid(True, linestyle='--', alpha=0.7)
-        else:
-            ax1.text(0.5, 0.5, 'No cases data available', ha='center', va='center', transform=ax1.transAxes)
-        
-        # Plot deaths
-        if 'new_deaths_smoothed' in data.columns and not data['new_deaths_smoothed'].isna().all():
-            ax2.plot(data['date'], data['new_deaths_smoothed'], color='#e74c3c')
-            ax2.set_title('New Deaths (7-day avg)')
-            ax2.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax2.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-            plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
-            ax2.grid(True, linestyle='--', alpha=0.7)
-        else:
-            ax2.text(0.5, 0.5, 'No deaths data available', ha='center', va='center', transform=ax2.transAxes)
-        
-        # Plot testing
-        if 'positive_rate' in data.columns and not data['positive_rate'].isna().all():
-            ax3.plot(data['date'], data['positive_rate'], color='#f39c12')
-            ax3.set_title('Positive Test Rate')
-            ax3.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax3.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-            plt.setp(ax3.xaxis.get_majorticklabels(), rotation=45, ha='right')
-            ax3.grid(True, linestyle='--', alpha=0.7)
-        else:
-            ax3.text(0.5, 0.5, 'No testing data available', ha='center', va='center', transform=ax3.transAxes)
-        
-        # Plot vaccinations
-        if 'people_fully_vaccinated' in data.columns and not data['people_fully_vaccinated'].isna().all():
-            # Get the population for percentage calculation
-            if 'population' in data.columns and not pd.isna(data['population'].iloc[0]):
-                population = data['population'].iloc[0]
-                data['vaccination_percentage'] = (data['people_fully_vaccinated'] / population) * 100
-                ax4.plot(data['date'], data['vaccination_percentage'], color='#2ecc71')
-                ax4.set_title('Fully Vaccinated (%)')
-                ax4.set_ylim([0, 100])
-            else:
-                ax4.plot(data['date'], data['people_fully_vaccinated'], color='#2ecc71')
-                ax4.set_title('Fully Vaccinated (Count)')
-            
-            ax4.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-            ax4.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-            plt.setp(ax4.xaxis.get_majorticklabels(), rotation=45, ha='right')
-            ax4.grid(True, linestyle='--', alpha=0.7)
+        """Fill the trends tab with graphs (the figure is created once and redrawn in place)."""
+        if self.trends_fig is None:
+            # Create figure and canvas
+            self.trends_fig = plt.Figure(figsize=(10, 8), dpi=100)
+            self.trends_canvas = FigureCanvasTkAgg(self.trends_fig, master=tab)
+            self.trends_canvas.get_tk_widget().pack(fill="both", expand=True)
         else:
-            ax4.text(0.5, 0.5, 'No vaccination data available', ha='center', va='center', transform=ax4.transAxes)
+            self.trends_fig.clear()
         
-        fig.tight_layout()
+        plot_trends(self.trends_fig, data)
+        self.trends_fig.tight_layout()
+        self.trends_canvas.draw_idle()
 
     def add_population_info(self, tab, data):
         """Add population information to the tab."""
@@ -571,39 +3258,11 @@ class CovidDataTracker:
         frame = tk.Frame(tab, bg="#f0f0f0")
         frame.pack(fill="both", expand=True, padx=20, pady=20)
         
-        # Define population metrics
-        population_metrics = [
-            ("Population", "population"),
-            ("Population Density", "population_density"),
-            ("Median Age", "median_age"),
-            ("Aged 65 Older", "aged_65_older"),
-            ("Aged 70 Older", "aged_70_older"),
-            ("GDP Per Capita", "gdp_per_capita"),
-            ("Life Expectancy", "life_expectancy"),
-            ("Human Development Index", "human_development_index")
-        ]
-        
         # Add metrics
-        for i, (label, column) in enumerate(population_metrics):
-            if column in data.columns and not pd.isna(data[column].iloc[0]):
-                value = data[column].iloc[0]
-                
-                # Format value
-                if column == "population":
-                    formatted_value = f"{value:,.0f}"
-                elif column == "population_density":
-                    formatted_value = f"{value:.1f} per km²"
-                elif "aged" in column:
-                    formatted_value = f"{value:.1f}%"
-                elif column == "gdp_per_capita":
-                    formatted_value = f"${value:,.0f}"
-                elif column == "life_expectancy":
-                    formatted_value = f"{value:.1f} years"
-                elif column == "human_development_index":
-                    formatted_value = f"{value:.3f}"
-                else:
-                    formatted_value = f"{value}"
-                
+        formatted = format_frame(data, [column for _, column in POPULATION_METRICS]).iloc[0]
+        for i, (label, column) in enumerate(POPULATION_METRICS):
+            formatted_value = formatted.get(column)
+            if formatted_value:
                 # Row frame
                 row_frame = tk.Frame(frame, bg="#f0f0f0")
                 row_frame.pack(fill="x", pady=5)
@@ -652,8 +3311,7 @@ class CovidDataTracker:
             continent_label = tk.Label(control_frame, text="Filter by Continent:", bg="#f0f0f0", font=("Arial", 12))
             continent_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
             
-            continents = ["All"] + sorted(self.df[self.df['iso_code'].str.contains('OWID_', na=False) & 
-                                          ~self.df['iso_code'].isin(['OWID_WRL', 'OWID_HIC', 'OWID_UMC', 'OWID_LMC', 'OWID_LIC'])]['location'].unique().tolist())
+            continents = ["All"] + self.data.geography.continents()
             
             self.continent_var = tk.StringVar(value="All")
             continent_dropdown = ttk.Combobox(
@@ -669,17 +3327,11 @@ class CovidDataTracker:
             metric_label = tk.Label(control_frame, text="Metric:", bg="#f0f0f0", font=("Arial", 12))
             metric_label.grid(row=0, column=2, padx=5, pady=5, sticky="w")
             
-            vacc_metrics = [
-                "people_vaccinated_per_hundred", 
-                "people_fully_vaccinated_per_hundred",
-                "total_boosters_per_hundred"
-            ]
-            
             self.vacc_metric_var = tk.StringVar(value="people_fully_vaccinated_per_hundred")
             metric_dropdown = ttk.Combobox(
                 control_frame, 
                 textvariable=self.vacc_metric_var,
-                values=vacc_metrics,
+                values=VACCINATION_METRICS,
                 width=30,
                 font=("Arial", 12)
             )
@@ -696,6 +3348,7 @@ class CovidDataTracker:
             # Create the figure and canvas
             self.vacc_fig = plt.Figure(figsize=(10, 8), dpi=100)
             self.vacc_canvas = FigureCanvasTkAgg(self.vacc_fig, master=plot_frame)
+            self.vacc_canvas.draw = PROFILER.timed("draw")(self.vacc_canvas.draw)
             self.vacc_canvas.get_tk_widget().pack(fill="both", expand=True)
             
             # Initial update
@@ -711,136 +3364,460 @@ class CovidDataTracker:
 
     def update_vaccination_graph(self):
         """Update the vaccination progress graph."""
+        metric = self.vacc_metric_var.get()
+        continent = self.continent_var.get()
+        date_range = self.date_range()
+        requested = time.perf_counter()
+        
+        self.worker.submit(
+            "vaccination_graph",
+            lambda: self.data.prepare_vaccination_data(metric, continent, date_range),
+            lambda vacc: self.render_vaccination_graph(vacc, requested),
+            self.show_worker_error
+        )
+
+    def render_vaccination_graph(self, vacc, requested=None):
+        """Draw a prepared vaccination graph on the Tk thread (see render_graph for ``requested``)."""
         try:
             self.vacc_fig.clear()
+            with PROFILER.stage("plot_vaccination"):
+                plot_vaccination(self.vacc_fig, vacc)
             
-            # Add subplots
-            ax1 = self.vacc_fig.add_subplot(211)  # Top countries
-            ax2 = self.vacc_fig.add_subplot(212)  # Timeline
-            
-            metric = self.vacc_metric_var.get()
-            continent = self.continent_var.get()
-            
-            # Format metric for display
-            if metric == "people_vaccinated_per_hundred":
-                metric_title = "At Least One Dose"
-            elif metric == "people_fully_vaccinated_per_hundred":
-                metric_title = "Fully Vaccinated"
-            else:
-                metric_title = "Boosters"
-                
-            # Get the latest date with good data coverage
-            latest_dates = self.df.groupby('location')['date'].max().reset_index()
-            recent_date = latest_dates['date'].value_counts().idxmax()
-            
-            # Filter data by continent if needed
-            if continent != "All":
-                # Get countries in the selected continent
-                continent_data = self.df[self.df['location'] == continent]
-                if not continent_data.empty and 'continent' in continent_data.columns:
-                    continent_val = continent
-                else:
-                    # Extract continent from location
-                    continent_val = continent
-                    
-                # Filter countries by the selected continent
-                countries_in_continent = self.df[self.df['continent'] == continent_val]['location'].unique()
-                filtered_data = self.df[self.df['location'].isin(countries_in_continent)]
-            else:
-                filtered_data = self.df.copy()
-            
-            # Filter out continents, world, and income groups for the bar chart
-            country_data = filtered_data[~filtered_data['iso_code'].str.contains('OWID_', na=False)]
-            
-            # Get latest data for each country
-            latest_data = []
-            for location in country_data['location'].unique():
-                country_latest = country_data[country_data['location'] == location].sort_values('date').tail(1)
-                if not country_latest.empty and metric in country_latest.columns and not pd.isna(country_latest[metric].iloc[0]):
-                    latest_data.append(country_latest)
-            
-            if latest_data:
-                latest_df = pd.concat(latest_data)
-                
-                # Sort by the metric and get top countries
-                top_countries = latest_df.sort_values(by=metric, ascending=False).head(15)
-                
-                # Create bar chart
-                bars = ax1.barh(top_countries['location'], top_countries[metric], color=sns.color_palette("viridis", 15))
-                ax1.set_title(f"Top Countries by Vaccination Rate ({metric_title})", fontsize=14)
-                ax1.set_xlabel("Percentage of Population (%)", fontsize=12)
-                ax1.invert_yaxis()  # To have highest value at the top
-                ax1.grid(True, linestyle='--', alpha=0.7, axis='x')
-                
-                # Add percentages to bars
-                for bar in bars:
-                    width = bar.get_width()
-                    ax1.text(width + 1, bar.get_y() + bar.get_height()/2, f'{width:.1f}%', 
-                            va='center', fontsize=10)
-            else:
-                ax1.text(0.5, 0.5, "No vaccination data available", ha='center', va='center', 
-                         transform=ax1.transAxes, fontsize=14)
-            
-            # Create timeline for selected countries or regions
-            if continent == "All":
-                # Show global and continent trends
-                timeline_data = filtered_data[filtered_data['iso_code'].str.contains('OWID_')].copy()
-                timeline_entities = ['OWID_WRL'] + [iso for iso in timeline_data['iso_code'].unique() 
-                                                 if iso != 'OWID_WRL' and not any(x in iso for x in ['HIC', 'UMC', 'LMC', 'LIC'])]
-                timeline_df = timeline_data[timeline_data['iso_code'].isin(timeline_entities)]
-            else:
-                # Show selected continent and its top countries
-                if continent != "All" and top_countries is not None and not top_countries.empty:
-                    top_5_countries = top_countries.head(5)['location'].tolist()
-                    continent_code = filtered_data[filtered_data['location'] == continent]['iso_code'].iloc[0] \
-                                    if not filtered_data[filtered_data['location'] == continent].empty else None
-                    
-                    timeline_entities = []
-                    if continent_code:
-                        timeline_entities.append(continent_code)
-                    timeline_entities.extend(top_5_countries)
-                    
-                    timeline_df = filtered_data[filtered_data['location'].isin(timeline_entities)]
-                else:
-                    timeline_df = pd.DataFrame()  # Empty dataframe if no data
-            
-            # Plot timeline
-            if not timeline_df.empty and metric in timeline_df.columns:
-                # Get unique locations
-                locations = timeline_df['location'].unique()
-                colors = sns.color_palette("viridis", len(locations))
-                
-                # Plot each location
-                for i, location in enumerate(locations):
-                    loc_data = timeline_df[timeline_df['location'] == location].sort_values('date')
-                    if not loc_data[metric].isna().all():
-                        ax2.plot(loc_data['date'], loc_data[metric], 
-                                label=location, color=colors[i], linewidth=2)
-                
-                ax2.set_title(f"Vaccination Progress Over Time ({metric_title})", fontsize=14)
-                ax2.set_xlabel("Date", fontsize=12)
-                ax2.set_ylabel("Percentage of Population (%)", fontsize=12)
-                ax2.grid(True, linestyle='--', alpha=0.7)
-                ax2.legend(loc='upper left')
-                
-                # Format x-axis
-                ax2.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-                ax2.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
-                plt.setp(ax2.xaxis.get_majorticklabels(), rotation=45, ha='right')
-            else:
-                ax2.text(0.5, 0.5, "No timeline data available", ha='center', va='center', 
-                         transform=ax2.transAxes, fontsize=14)
-            
-            self.vacc_fig.tight_layout()
+            with PROFILER.stage("tight_layout"):
+                self.vacc_fig.tight_layout()
             self.vacc_canvas.draw()
+            if requested is not None:
+                PROFILER.record("update_vaccination_graph", requested, time.perf_counter() - requested)
             
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
 
+
+# Views the headless renderer can produce. For "vaccination" the country is a
+# continent name or "All" and the metric one of VACCINATION_METRICS.
+RENDER_VIEWS = ["line", "top", "trends", "vaccination"]
+
+# Dataset loaded once per render process
+_render_dataset = None
+
+
+def chart_filename(country, metric, view, fmt):
+    """File name for a rendered chart, e.g. 'United_States_new_cases_line.png'."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", country).strip("_")
+    return f"{slug}_{metric}_{view}.{fmt}"
+
+
+def render_chart(dataset, country, metric, view, path, fmt=None):
+    """Render one chart to an image file (or file object) with the Agg backend (no display needed)."""
+    if view == "line":
+        fig = plt.Figure(figsize=(10, 6), dpi=100)
+        plot_graph(fig, dataset.prepare_graph(country, metric, False))
+    elif view == "top":
+        fig = plt.Figure(figsize=(10, 6), dpi=100)
+        plot_graph(fig, dataset.prepare_graph(country, metric, True))
+    elif view == "trends":
+        fig = plt.Figure(figsize=(10, 8), dpi=100)
+        dataset.require(TRENDS_COLUMNS)
+        plot_trends(fig, dataset.location_rows(country))
+    elif view == "vaccination":
+        fig = plt.Figure(figsize=(10, 8), dpi=100)
+        plot_vaccination(fig, dataset.prepare_vaccination_data(metric, country))
+    else:
+        raise ValueError(f"Unknown view: {view}")
+    
+    FigureCanvasAgg(fig)
+    fig.tight_layout()
+    fig.savefig(path, format=fmt)
+
+
+def _init_render_process(csv_path, low_memory, compact=False):
+    """Load the dataset once in each render process (from the columnar cache)."""
+    global _render_dataset
+    _render_dataset = CovidDataset.load(csv_path, low_memory=low_memory, lazy=True, compact=compact)
+
+
+def _render_job(job):
+    """Render a single (country, metric, view, path) job; returns (path, error)."""
+    country, metric, view, path = job
+    try:
+        render_chart(_render_dataset, country, metric, view, path)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def render_batch(jobs, out_dir, fmt="png", workers=None, csv_path=DATA_FILE, low_memory=False, compact=False):
+    """Render (country, metric, view) jobs across a process pool.
+
+    Returns a list of (path, error) pairs, with error None on success.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [
+        (country, metric, view, os.path.join(out_dir, chart_filename(country, metric, view, fmt)))
+        for country, metric, view in jobs
+    ]
+    if not tasks:
+        return []
+    
+    # Build the columnar cache once up front so the workers start warm
+    load_dataset(csv_path, low_memory=low_memory)
+    
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_process, initargs=(csv_path, low_memory, compact)) as pool:
+        return list(pool.map(_render_job, tasks, chunksize=chunksize))
+
+
+def read_render_jobs(path):
+    """Read (country, metric, view) jobs from a CSV file with those three columns."""
+    with open(path, newline="") as f:
+        return [(row["country"], row["metric"], row.get("view") or "line") for row in csv.DictReader(f)]
+
+
+def render_command(args):
+    """Run the 'render' subcommand; returns the process exit code."""
+    if args.jobs:
+        jobs = read_render_jobs(args.jobs)
+    else:
+        countries = args.country or ["World"]
+        if args.all_countries:
+            countries = ["World"] + CovidDataset.load(args.data, low_memory=args.low_memory).countries
+        metrics = args.metric or list(METRICS)
+        jobs = [(country, metric, view) for country in countries for metric in metrics for view in args.view
+                if view != "top"]
+        # The top-countries chart is the same whatever the country, so render it once per metric
+        if "top" in args.view:
+            jobs += [(countries[0], metric, "top") for metric in metrics]
+    
+    start = time.perf_counter()
+    results = render_batch(jobs, args.out, args.format, args.workers, args.data, args.low_memory, args.compact)
+    failed = [(path, error) for path, error in results if error]
+    for path, error in failed:
+        print(f"Failed to render {path}: {error}", file=sys.stderr)
+    print(f"Rendered {len(results) - len(failed)} of {len(results)} charts in {time.perf_counter() - start:.1f}s")
+    return 1 if failed else 0
+
+
+# Local HTTP query API ("serve" subcommand)
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8050
+
+HTTP_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    """A request that cannot be answered, with the HTTP status to send."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryServer:
+    """Serves series, rankings and charts from one loaded CovidDataset over HTTP.
+
+    Built on asyncio's streams, so no web framework is needed. Queries run
+    on a thread pool against the shared in-memory dataset; chart rendering
+    is serialized because matplotlib is not thread-safe. Responses carry an
+    ETag and are kept in a small LRU cache keyed by the dataset version and
+    the normalized query, so a matching If-None-Match is answered with 304
+    without running the query again. Listens on the loopback interface only.
+
+    Endpoints (GET or HEAD):
+      /series?country=World&metric=new_cases[&window=auto&method=mean&days=90|start=&end=]
+      /top?metric=total_cases[&n=10&window=&method=]
+      /chart?country=World&metric=new_cases[&view=line]
+    """
+
+    def __init__(self, dataset, port=SERVE_PORT, workers=4, cache_entries=256):
+        self.dataset = dataset
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.render_lock = threading.Lock()
+        self.cache_entries = cache_entries
+        self.responses = OrderedDict()
+        self.inflight = {}
+        self.server = None
+        self.routes = {"/series": self.series, "/top": self.top, "/chart": self.chart}
+
+    async def start(self):
+        """Start listening; returns the port actually bound (useful with port 0)."""
+        self.server = await asyncio.start_server(self.handle, SERVE_HOST, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Serving on http://{SERVE_HOST}:{self.port}/ (Ctrl+C to stop)")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        """Answer one request per connection."""
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                return
+            method, target, _ = parts
+            status, content_type, body, etag = await self.respond(method, target, headers.get("if-none-match"))
+            
+            head = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}", "Connection: close"]
+            if etag:
+                head += [f"ETag: {etag}", "Cache-Control: no-cache"]
+            if status != 304:
+                head += [f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            if method == "GET" and status != 304:
+                writer.write(body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, if_none_match):
+        """Return (status, content type, body, etag) for a request."""
+        if method not in ("GET", "HEAD"):
+            return self.error(405, f"Method {method} not allowed")
+        url = urlsplit(target)
+        route = self.routes.get(url.path)
+        if route is None:
+            return self.error(404, f"Unknown path: {url.path}")
+        
+        query = dict(parse_qsl(url.query))
+        key = (self.dataset.version, url.path, tuple(sorted(query.items())))
+        try:
+            etag, content_type, body = await self.cached(key, lambda: route(query))
+        except HTTPError as e:
+            return self.error(e.status, str(e))
+        except Exception as e:
+            return self.error(500, str(e))
+        
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return 304, content_type, b"", etag
+        return 200, content_type, body, etag
+
+    async def cached(self, key, compute):
+        """Return the cached (etag, content type, body) for key, running compute on a miss.
+
+        Concurrent requests for the same key share one computation.
+        """
+        if key in self.responses:
+            self.responses.move_to_end(key)
+            return self.responses[key]
+        if key not in self.inflight:
+            self.inflight[key] = asyncio.get_running_loop().run_in_executor(self.executor, compute)
+        try:
+            content_type, body = await asyncio.shield(self.inflight[key])
+        finally:
+            self.inflight.pop(key, None)
+        
+        response = ('"' + hashlib.sha1(body).hexdigest()[:20] + '"', content_type, body)
+        self.responses[key] = response
+        while len(self.responses) > self.cache_entries:
+            self.responses.popitem(last=False)
+        return response
+
+    @staticmethod
+    def error(status, message):
+        body = json.dumps({"error": message}).encode()
+        return status, "application/json", body, None
+
+    @staticmethod
+    def to_json(payload):
+        return "application/json", json.dumps(payload, allow_nan=False).encode()
+
+    @staticmethod
+    def json_values(values):
+        """Float values as a JSON-ready list with None for missing values."""
+        values = np.asarray(values, dtype=np.float64)
+        return [None if np.isnan(value) else value for value in values.tolist()]
+
+    def location(self, query):
+        country = query.get("country", "World")
+        if country != "World" and country not in self.dataset.index.by_location:
+            raise HTTPError(404, f"Unknown location: {country}")
+        return country
+
+    def metric(self, query, default):
+        metric = query.get("metric", default)
+        if not self.dataset.has_column(metric):
+            raise HTTPError(404, f"Unknown metric: {metric}")
+        # Text columns such as tests_units (and the key columns) cannot be plotted or ranked
+        self.dataset.require([metric])
+        if metric in KEY_COLUMNS or not pd.api.types.is_numeric_dtype(self.dataset.df[metric].dtype):
+            raise HTTPError(400, f"Not a numeric metric: {metric}")
+        return metric
+
+    def smoothing(self, query, default="auto"):
+        """(method, window) from the method and window parameters, as in the main window."""
+        method = query.get("method", "mean")
+        if method not in SmoothingEngine.METHODS:
+            raise HTTPError(400, f"Unknown smoothing method: {method}")
+        window = query.get("window", default)
+        if window in ("auto", "off", None):
+            return method, None if window == "off" else window
+        if not window.isdigit() or int(window) < 1:
+            raise HTTPError(400, f"Invalid smoothing window: {window}")
+        return method, int(window)
+
+    def date_range(self, query):
+        days = query.get("days")
+        if days is not None and (not days.isdigit() or int(days) < 1):
+            raise HTTPError(400, f"Invalid number of days: {days}")
+        try:
+            return self.dataset.date_range(int(days) if days else None, query.get("start"), query.get("end"))
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid date range: {e}")
+
+    def series(self, query):
+        """A location's values of a metric, with the smoothed line when there is one."""
+        country = self.location(query)
+        metric = self.metric(query, "new_cases")
+        method, window = self.smoothing(query)
+        graph = self.dataset.prepare_graph(country, metric, False, method, window, self.date_range(query))
+        
+        country_data = graph["country_data"]
+        payload = {
+            "country": country,
+            "metric": metric,
+            "label": graph["readable_metric"],
+            "dates": country_data['date'].dt.strftime("%Y-%m-%d").tolist(),
+            "values": self.json_values(country_data[metric]),
+        }
+        if "rolling_avg" in graph:
+            payload["smoothing"] = graph["smoothing"]
+            payload["smoothed"] = self.json_values(graph["rolling_avg"])
+        return self.to_json(payload)
+
+    def top(self, query):
+        """The countries with the highest values on the common reporting date."""
+        metric = self.metric(query, "total_cases")
+        n = query.get("n", "10")
+        if not n.isdigit() or not 1 <= int(n) <= len(self.dataset.countries):
+            raise HTTPError(400, f"Invalid count: {n}")
+        method, window = self.smoothing(query, default="off")
+        
+        self.dataset.require([metric])
+        values = self.dataset.smoothing.smooth(metric, method, window) if window not in (None, "auto") else None
+        top_data = self.dataset.snapshot.top_countries(metric, int(n), values)
+        top_values = top_data[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+        common_date = self.dataset.snapshot.common_date
+        return self.to_json({
+            "metric": metric,
+            "label": metric_info(metric).label,
+            "date": pd.Timestamp(common_date).strftime("%Y-%m-%d") if common_date is not None else None,
+            "locations": top_data['location'].astype(str).tolist(),
+            "values": self.json_values(top_values),
+            "formatted": format_values(metric, top_values),
+        })
+
+    def chart(self, query):
+        """A PNG of one of the render views."""
+        country = query.get("country", "World")
+        view = query.get("view", "line")
+        if view not in RENDER_VIEWS:
+            raise HTTPError(400, f"Unknown view: {view}")
+        if view != "vaccination":
+            country = self.location(query)
+        metric = self.metric(query, "people_fully_vaccinated_per_hundred" if view == "vaccination" else "new_cases")
+        
+        buffer = io.BytesIO()
+        with self.render_lock:
+            render_chart(self.dataset, country, metric, view, buffer, fmt="png")
+        return "image/png", buffer.getvalue()
+
+
+def serve_command(args):
+    """Run the 'serve' subcommand until interrupted; returns the process exit code."""
+    dataset = CovidDataset.load(args.data, low_memory=args.low_memory, lazy=True, compact=args.compact)
+    print(dataset.describe_load())
+    server = QueryServer(dataset, args.port, args.workers)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def memory_command(args):
+    """Run the 'memory' subcommand: load every column compacted and print the per-column report."""
+    dataset = CovidDataset.load(args.data, low_memory=args.low_memory, compact=True)
+    print(dataset.describe_load())
+    for line in memory_report(dataset.memory_report()):
+        print(line)
+    return 0
+
+
+def add_data_options(parser):
+    """Options shared by every mode; accepted before or after the subcommand."""
+    parser.add_argument("--data", default=argparse.SUPPRESS, help="path to the OWID CSV")
+    parser.add_argument("--low-memory", action="store_true", default=argparse.SUPPRESS,
+                        help="load only the columns the views use, streaming the CSV in chunks")
+    parser.add_argument("--compact", action="store_true", default=argparse.SUPPRESS,
+                        help="store mostly-empty columns sparse and large counts as Int32")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="COVID-19 Global Data Tracker")
+    add_data_options(parser)
+    parser.set_defaults(data=DATA_FILE, low_memory=False, compact=False)
+    subparsers = parser.add_subparsers(dest="command")
+    
+    render = subparsers.add_parser("render", help="render charts to image files without a display")
+    add_data_options(render)
+    render.add_argument("--jobs", help="CSV file with country,metric,view columns")
+    render.add_argument("--country", action="append", help="country to render (repeatable, default World)")
+    render.add_argument("--all-countries", action="store_true", help="render World and every country")
+    render.add_argument("--metric", action="append", help="metric to render (repeatable, default all)")
+    render.add_argument("--view", action="append", choices=RENDER_VIEWS, help="view to render (repeatable, default line)")
+    render.add_argument("--out", default="charts", help="output directory")
+    render.add_argument("--format", default="png", choices=["png", "svg"], help="image format")
+    render.add_argument("--workers", type=int, help="number of render processes (default: CPU count)")
+    
+    serve = subparsers.add_parser("serve", help="serve series, rankings and charts over HTTP on localhost")
+    add_data_options(serve)
+    serve.add_argument("--port", type=int, default=SERVE_PORT, help=f"port to listen on (default {SERVE_PORT})")
+    serve.add_argument("--workers", type=int, default=4, help="number of query threads")
+    
+    memory = subparsers.add_parser("memory", help="report the memory each column takes in compact storage")
+    add_data_options(memory)
+    
+    args = parser.parse_args(argv)
+    if args.command == "render" and not args.view:
+        args.view = ["line"]
+    return args
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "render":
+        sys.exit(render_command(args))
+    if args.command == "serve":
+        sys.exit(serve_command(args))
+    if args.command == "memory":
+        sys.exit(memory_command(args))
+    
     try:
+        matplotlib.use("TkAgg")
         root = tk.Tk()
-        app = CovidDataTracker(root)
+        app = CovidDataTracker(root, args.data, args.low_memory, args.compact)
         root.mainloop()
     except Exception as e:
         print(f"Error starting application: {str(e)}")
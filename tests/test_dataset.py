@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import generate_dataset
+from covid_tracker import CovidDataset, DatasetCache, DerivedMetrics, load_dataset
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "owid.csv"
+    generate_dataset(path, countries=12, days=120)
+    return path
+
+
+def test_moving_average_after_refresh(csv_path, tmp_path):
+    dataset = CovidDataset.load(str(csv_path), use_cache=False)
+    before = dataset.prepare_graph("World", "new_cases", False, window=7)
+
+    # One new day for Africa shifts the rows of every location sorted after it
+    frame = pd.read_csv(csv_path)
+    last = frame[frame["location"] == "Africa"].iloc[-1]
+    delta = pd.DataFrame({
+        "iso_code": [last["iso_code"]],
+        "date": [(pd.Timestamp(last["date"]) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")],
+        "new_cases": [1.0],
+    })
+    delta_path = tmp_path / "delta.csv"
+    delta.to_csv(delta_path, index=False)
+    dataset.apply_refresh(dataset.prepare_refresh(str(delta_path)))
+
+    after = dataset.prepare_graph("World", "new_cases", False, window=7)
+    fresh = CovidDataset(dataset.df).prepare_graph("World", "new_cases", False, window=7)
+    np.testing.assert_allclose(before["rolling_avg"], fresh["rolling_avg"])
+    np.testing.assert_allclose(after["rolling_avg"], fresh["rolling_avg"])
+
+
+def test_cold_low_memory_load(csv_path):
+    # No cache yet: the CSV is streamed in chunks
+    cold = CovidDataset.load(str(csv_path), low_memory=True)
+    full = CovidDataset.load(str(csv_path), use_cache=False)
+    assert cold.countries == full.countries
+    assert cold.geography.continents() == full.geography.continents()
+    for continent in full.geography.continents():
+        np.testing.assert_array_equal(cold.geography.continent_mask(continent), full.geography.continent_mask(continent))
+
+
+def test_refresh_updates_in_place(csv_path, tmp_path):
+    frame = pd.read_csv(csv_path)
+    # A new day for Africa, a row before a country's first date and a new location
+    africa = frame[frame["location"] == "Africa"].tail(1).assign(date="2030-01-01", new_cases=5.0)
+    first = frame[frame["location"] == frame["location"].iloc[0]].head(1).assign(date="2000-01-01")
+    new = frame[frame["location"] == "World"].tail(2).assign(location="Newland", iso_code="NWL")
+    revised = frame.sample(20, random_state=1).assign(new_cases=1234.0)
+    delta_path = tmp_path / "delta.csv"
+    pd.concat([africa, first, new, revised]).to_csv(delta_path, index=False)
+
+    CovidDataset.load(str(csv_path))  # writes the cache the lazy load reads
+    dataset = CovidDataset.load(str(csv_path), lazy=True)
+    dataset.require(["new_cases", "case_fatality_rate"])
+    dataset.smoothing.smooth("new_cases", "mean", 7)
+    refresh = dataset.prepare_refresh(str(delta_path))
+    dataset.apply_refresh(refresh)
+    assert refresh["added"] == 4
+
+    dataset.require(["icu_patients"])
+    fresh = CovidDataset(dataset.df.copy())
+    assert dataset.index.locations == fresh.index.locations
+    np.testing.assert_array_equal(dataset.index.starts, fresh.index.starts)
+    np.testing.assert_array_equal(dataset.snapshot.common_positions, fresh.snapshot.common_positions)
+    assert dataset.countries == fresh.countries
+    np.testing.assert_allclose(dataset.smoothing.smooth("new_cases", "mean", 7), fresh.smoothing.smooth("new_cases", "mean", 7))
+    np.testing.assert_allclose(dataset.df["case_fatality_rate"], fresh.derived.evaluate("case_fatality_rate", fresh.df), rtol=1e-6)
+    pd.testing.assert_series_equal(dataset.snapshot.last_valid("icu_patients"), fresh.snapshot.last_valid("icu_patients"))
+    # Every column is loaded now, so no refresh patches are kept
+    dataset.require(dataset.column_store.lazy_columns())
+    assert dataset.column_store.patches == []
+
+    # Refreshing with the same file again changes nothing
+    repeat = dataset.prepare_refresh(str(delta_path))
+    assert repeat["added"] == repeat["revised"] == 0
+
+
+def test_cache_round_trip(csv_path):
+    parsed = load_dataset(str(csv_path), use_cache=False)
+    load_dataset(str(csv_path))  # writes the cache
+    cache = DatasetCache(str(csv_path))
+    pd.testing.assert_frame_equal(cache.load(), parsed)
+    pd.testing.assert_frame_equal(cache.load(["location", "new_cases"]), parsed[["location", "new_cases"]])
+
+    # Any change to the CSV makes the cache stale
+    text = csv_path.read_text()
+    csv_path.write_text(text + text.splitlines(keepends=True)[-1])
+    assert cache.load() is None
+
+
+def test_derived_lag_skips_date_gaps():
+    frame = pd.DataFrame({
+        "location": pd.Categorical(["A", "A", "A", "B", "B"]),
+        "date": pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-04", "2021-01-02", "2021-01-03"]),
+        "cases": [10.0, 20.0, 40.0, 5.0, 0.0],
+    })
+    derived = DerivedMetrics({"growth": "cases / lag(cases, 1)", "double": "2 * cases"})
+    # A's 2021-01-04 has no row a day earlier, B's first row has none either,
+    # and B's 0 / 5 is a real value while nothing is divided across locations
+    np.testing.assert_array_equal(derived.evaluate("growth", frame), [np.nan, 2.0, np.nan, np.nan, 0.0])
+    np.testing.assert_array_equal(derived.evaluate("double", frame), 2 * frame["cases"].to_numpy())
+    with pytest.raises(ValueError):
+        DerivedMetrics({"bad": "__import__('os')"}).evaluate("bad", frame)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from covid_tracker import minmax_indices
+
+
+def test_minmax_indices_keeps_extremes():
+    values = np.random.default_rng(0).normal(size=10_000)
+    values[[1234, 5678]] = [50.0, -50.0]
+    values[2000:2100] = np.nan
+    indices = minmax_indices(values, 100)
+
+    assert len(indices) <= 2 * 100 + 2
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert {1234, 5678} <= set(indices.tolist())
+    assert np.all(np.diff(indices) > 0)
+    # Every bucket is represented, so the drawn line spans the whole range
+    assert np.max(np.diff(indices)) <= 2 * len(values) // 100
+
+
+def test_minmax_indices_short_series_kept_whole():
+    values = np.arange(50.0)
+    np.testing.assert_array_equal(minmax_indices(values, 100), np.arange(50))
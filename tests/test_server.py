@@ -0,0 +1,72 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmark import generate_dataset
+from covid_tracker import CovidDataset, QueryServer
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "owid.csv"
+    generate_dataset(path, countries=8, days=90)
+    server = QueryServer(CovidDataset.load(str(path)), port=0)
+    loop = asyncio.new_event_loop()
+    port = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{port}"
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=10)
+
+
+def get(url, headers=None):
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_series_and_etag(server):
+    status, headers, body = get(f"{server}/series?country=World&metric=new_cases&days=30&window=7")
+    assert status == 200
+    payload = json.loads(body)
+    assert len(payload["dates"]) == len(payload["values"]) == len(payload["smoothed"]) == 30
+
+    status, _, body = get(f"{server}/series?country=World&metric=new_cases&days=30&window=7",
+                          {"If-None-Match": headers["ETag"]})
+    assert status == 304 and body == b""
+
+
+def test_top_and_chart(server):
+    status, _, body = get(f"{server}/top?metric=total_cases&n=3")
+    payload = json.loads(body)
+    assert status == 200 and len(payload["locations"]) == 3
+    assert payload["values"] == sorted(payload["values"], reverse=True)
+
+    status, headers, body = get(f"{server}/chart?country=World&metric=new_cases")
+    assert status == 200 and headers["Content-Type"] == "image/png" and body.startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/nope", 404),
+    ("/series?country=Atlantis", 404),
+    ("/series?metric=no_such_metric", 404),
+    ("/series?metric=tests_units", 400),
+    ("/series?days=0", 400),
+    ("/series?days=-5", 400),
+    ("/series?window=x", 400),
+    ("/top?n=0", 400),
+    ("/chart?view=pie", 400),
+])
+def test_bad_requests(server, path, status):
+    code, _, body = get(server + path)
+    assert code == status
+    assert "error" in json.loads(body)